@@ -1,23 +1,32 @@
 import os
-from flask import Flask, render_template, request, url_for, session, redirect, flash, jsonify, send_from_directory, abort, g
+from flask import Flask, render_template, request, url_for, session, redirect, flash, jsonify, send_from_directory, abort, Response, stream_with_context
 from flask_session import Session
 from config import Config
 import secrets
 import requests
-from urllib.parse import urlencode
+from urllib.parse import urlencode, urlparse
+import time
+import hmac
 import datetime
-from helpers import login_required, verify_signature, is_valid_input, instagram_username, is_video_link
+from helpers import login_required, verify_signature, is_valid_input, instagram_username, is_video_link, encode_cursor, decode_cursor, sign_media_path
 from config_celery import celery_init_app
 from uuid import uuid4
 import datetime
 from receive import Receive
-import redis 
-import json
 from graph_api import GraphApi
 from video_processor import VideoProcessor
+from rendition_cache import RenditionCache
+from render_index import RenderIndex
+from bg_db import db
 from werkzeug.middleware.proxy_fix import ProxyFix
-from db_pool import conn_pool
-from db_app import fetch, update
+from db_app import fetch, update, fetch_named, transaction, execute_values
+from redis_pool import redis_client
+from pending_tasks import PendingTasks
+import db_app
+import user_cache
+import job_events
+import metrics
+import posters
 
 app = Flask(__name__)
 
@@ -26,10 +35,9 @@ app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1, x_proto=1, x_host=1)
 # Setup Celery client
 celery = celery_init_app(app)
 
-# Setup redis 
-redis_client = redis.Redis(host='127.0.0.1', port=6379, db=0)
-
 app.config["SECRET_KEY"] = Config.secretKey
+# The web server sends files named by X-Sendfile
+app.config["USE_X_SENDFILE"] = Config.deliveryMode == "x-sendfile"
 
 # Configure session to use filesystem (instead of signed cookies)
 app.config["SESSION_PERMANENT"] = False
@@ -43,28 +51,7 @@ def index():
 @app.route("/dashboard")
 @login_required
 def dashboard():
-    rows = fetch("""
-        SELECT
-            vc.id,
-            vc.config_name,
-            vc.split_type,
-            vc.video_position,
-            vc.edit_type,
-            vc.original_video_percentage,
-            vc.created_at,
-            CASE 
-                WHEN vc.id = u.default_config_id THEN 1 
-                ELSE 0 
-            END AS is_default
-        FROM 
-            video_configurations vc 
-        JOIN 
-            users u 
-        ON u.id = vc.user_id 
-        WHERE 
-            vc.user_id = %s 
-        ORDER BY 
-            created_at DESC;""", args=(session["user_id"],))
+    rows = fetch_named("dashboard", args=(session["user_id"],))
  
     return render_template("dashboard.html", configs=rows)
 
@@ -96,6 +83,7 @@ def default_config():
     """
     new_config_id = configId if state == "set" else None
     update(query, args=(new_config_id,  session["user_id"], session["user_id"], configId))
+    user_cache.invalidate_user(session["user_id"])
     flash("Config successfully updated", "success")
     return redirect(url_for("dashboard"))
 
@@ -104,7 +92,8 @@ def default_config():
 def new_config():
     """Create video configurations"""
     if request.method == "GET":
-        return render_template("new_config.html")
+        return render_template("new_config.html", profiles=Config.encodingProfiles, default_profile=Config.defaultEncodingProfile,
+            resolutions=Config.outputResolutions, default_resolution=Config.defaultOutputResolution)
 
     # Ensure the config name was submitted
     if not (request.form.get("configName") and is_valid_input(request.form["configName"])):
@@ -124,6 +113,7 @@ def new_config():
         update("INSERT INTO video_configurations (id, user_id, config_name, created_at) VALUES (%s, %s, %s, %s);", 
             args=(configId, session["user_id"], config_name, datetime.datetime.now())
         )   
+        user_cache.invalidate_configs(session["user_id"])
         flash("Successfully registered", "success")
         return redirect(url_for("dashboard"))
     
@@ -175,12 +165,34 @@ def new_config():
     if process_option not in ["crop", "fit"]:
         flash("must provide a valid processing option", "danger")
         return redirect(url_for("new_config"))
+    
+    # Check the encoding profile
+    encodingProfile = request.form.get("encodingProfile", Config.defaultEncodingProfile)
+    if encodingProfile not in Config.encodingProfiles:
+        flash("must provide a valid encoding profile", "danger")
+        return redirect(url_for("new_config"))
+    
+    # Check the maximum output resolution
+    maxResolution = request.form.get("maxResolution", Config.defaultOutputResolution)
+    if maxResolution not in Config.outputResolutions:
+        flash("must provide a valid output resolution", "danger")
+        return redirect(url_for("new_config"))
           
-    update("INSERT INTO video_configurations (id, user_id, config_name, split_type, video_position, original_video_percentage, edit_type, created_at) VALUES (%s, %s, %s, %s , %s, %s, %s, %s);", 
-        args=(configId, session["user_id"], config_name, splitType, videoPosition, videoPercentage, process_option, datetime.datetime.now())
+    # Config and all its gameplays in one commit
+    with transaction() as cur:
+        cur.execute("INSERT INTO video_configurations (id, user_id, config_name, split_type, video_position, original_video_percentage, edit_type, encoding_profile, max_resolution, created_at) VALUES (%s, %s, %s, %s , %s, %s, %s, %s, %s, %s);", 
+            (configId, session["user_id"], config_name, splitType, videoPosition, videoPercentage, process_option, encodingProfile, maxResolution, datetime.datetime.now())
+        )
+        execute_values("INSERT INTO config_gameplays (config_id, gameplay_id) VALUES %s;", 
+            [(configId, v_id) for v_id in request.form.getlist("gameplay")], commit=False
+        )
+    user_cache.invalidate_configs(session["user_id"])
+    
+    # Prepare gameplay renditions ahead of the first job
+    warm_renditions.delay(
+        {"split_type": splitType, "video_position": videoPosition, "original_video_percentage": videoPercentage, "edit_type": process_option, "max_resolution": maxResolution},
+        request.form.getlist("gameplay")
     )
-    for v_id in request.form.getlist("gameplay"):
-        update("INSERT INTO config_gameplays (config_id, gameplay_id) VALUES (%s, %s);", args=(configId, v_id))
             
     flash("Successfully registered", "success")
     return redirect(url_for("dashboard"))
@@ -189,9 +201,14 @@ def new_config():
 @login_required
 def delete_config():
     config_id = request.form.get("configId")
-    row_count = update("DELETE FROM video_configurations WHERE id = %s AND user_id = %s;", args=(config_id, session["user_id"]))
+    with transaction() as cur:
+        cur.execute("DELETE FROM video_configurations WHERE id = %s AND user_id = %s;", (config_id, session["user_id"]))
+        row_count = cur.rowcount
+        if row_count:
+            cur.execute("UPDATE users SET default_config_id = %s WHERE id = %s AND default_config_id = %s;", (None, session["user_id"], config_id))
     if row_count:
-        update("UPDATE users SET default_config_id = %s WHERE id = %s AND default_config_id = %s;", args=(None, session["user_id"], config_id))
+        user_cache.invalidate_configs(session["user_id"])
+        user_cache.invalidate_user(session["user_id"])
         flash("Successfully deleted!", "success")
     else:
         flash("Couldn't delete, try again", "danger")
@@ -218,33 +235,32 @@ def settings():
         return redirect(url_for("settings"))
     
     update("UPDATE users SET ig_username = %s, ig_id = %s WHERE id = %s;", args=(igUsername, None, session["user_id"]))
+    user_cache.invalidate_user(session["user_id"])
     flash("Successfully saved IG username", "success")
     return redirect(url_for("settings"))
         
 @app.route("/progress")
 @login_required
 def progress():
-    query = """
-    SELECT
-        vj.id,
-        vj.caption,
-        g.title,
-        vc.config_name,
-        vj.status,
-        vj.created_at
-    FROM 
-        video_jobs vj 
-    LEFT JOIN 
-        video_configurations vc ON vj.config_id = vc.id 
-    LEFT JOIN 
-        gameplays g ON vj.gameplay_id = g.id 
-    WHERE
-        vj.user_id = %s
-    ORDER BY 
-        vj.created_at DESC;
-    """
-    rows = fetch(query, args=(session["user_id"],))
-    return render_template("progress.html", processes=rows)
+    rows, next_cursor = job_page("progress", None, Config.progressPerPage)
+    return render_template("progress.html", processes=rows, next_cursor=next_cursor)
+
+@app.route("/progress", methods=["POST"])
+@login_required
+def get_progress():
+    """Next page of jobs"""
+    rows, next_cursor = job_page("progress", request.form.get("cursor"), Config.progressPerPage)
+    return jsonify({"items": rows, "next_cursor": next_cursor})
+
+@app.route("/progress/events")
+@login_required
+def progress_events():
+    """Stream status and render progress of the user's jobs as Server-Sent Events"""
+    response = Response(stream_with_context(job_events.stream(session["user_id"])), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    # Stop nginx from buffering the stream
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
 
 @app.route("/output")
 @login_required
@@ -255,62 +271,126 @@ def output():
 @login_required
 def explore():
     """Explore gameplays videos"""
-    page = request.args.get("page", 1, type=int)
-    gameplays = fetch("SELECT * FROM gameplays LIMIT %s OFFSET %s;", args=(Config.gameplayPerPage, (page - 1) * Config.gameplayPerPage))
-    return jsonify(gameplays or [])
+    try:
+        last_id, = decode_cursor(request.args.get("cursor"), ("",))
+    except ValueError:
+        abort(400)
+    gameplays = fetch_named("gameplays", args=(last_id, Config.gameplayPerPage))
+    next_cursor = encode_cursor(gameplays[-1]["id"]) if len(gameplays) == Config.gameplayPerPage else None
+    return jsonify({"items": gameplays, "next_cursor": next_cursor})
 
 @app.route("/output", methods=["POST"])
 @login_required
 def get_output():
     """Retrieve processed video"""
-    query = """
-    SELECT
-        vj.id,
-        vj.caption
-    FROM 
-        video_jobs vj 
-    WHERE
-        vj.user_id = %s AND vj.status = 'completed'
-    ORDER BY 
-        vj.created_at DESC
-    LIMIT
-        %s
-    OFFSET %s;
-    """
-    page = request.form.get("page", 1, type=int)
-    output_videos = fetch(query, args=(session["user_id"], Config.outputPerPage, (page - 1) * Config.outputPerPage))
-    return jsonify(output_videos or [])
+    rows, next_cursor = job_page("outputs", request.form.get("cursor"), Config.outputPerPage)
+    return jsonify({"items": rows, "next_cursor": next_cursor})
+
+def job_page(query_name, cursor, per_page):
+    """Keyset page of the user's jobs ordered by (created_at, id) descending"""
+    try:
+        created_at, job_id = decode_cursor(cursor, ("infinity", ""))
+        if cursor:
+            datetime.datetime.fromisoformat(created_at)
+    except ValueError:
+        abort(400)
+    rows = fetch_named(query_name, args=(session["user_id"], created_at, job_id, per_page))
+    next_cursor = encode_cursor(rows[-1]["created_at"], rows[-1]["id"]) if len(rows) == per_page else None
+    for row in rows:
+        # Same text in the first page, the JSON pages and the job events, jsonify would send RFC 822
+        row["created_at"] = row["created_at"].isoformat(sep=" ")
+    return rows, next_cursor
 
 @app.route("/thumbnail/<string:file_name>")
 @login_required
 def thumbnail(file_name: str):
     """Send video thumbail"""
-    return send_from_directory(Config.thumbnailPath, file_name)
+    return cached_file(Config.thumbnailPath, file_name)
+
+@app.route("/poster/<string:id>")
+@login_required
+def poster(id: str):
+    """Send the poster frame of a finished video"""
+    return cached_file(Config.outputDirectory, posters.poster_name(output_file_name(id)), private=True)
+
+@app.route("/preview/<string:id>")
+@login_required
+def preview(id: str):
+    """Send the animated preview of a finished video"""
+    return cached_file(Config.outputDirectory, posters.preview_name(output_file_name(id)), private=True)
 
 @app.route("/download/<string:id>")
 @login_required
 def download(id: str):
     """Download video with id"""
+    file_name = output_file_name(id)
+    video_path = os.path.join(Config.outputDirectory, file_name)
+    if not os.path.exists(video_path):
+        abort(404, "File not found")
     
+    as_attachment = request.args.get("attachment", "false").lower() == "true"
+    return deliver_output(file_name, id + ".mp4", as_attachment)
+
+@app.route("/media/<string:file_name>")
+def media(file_name: str):
+    """Serve a signed output URL when no proxy checks the signature itself"""
+    expires = request.args.get("expires", 0, type=int)
+    token = sign_media_path(request.path, expires)
+    if expires < time.time() or not hmac.compare_digest(token, request.args.get("md5", "")):
+        abort(403)
+    download_name = request.args.get("download")
+    return send_from_directory(
+        Config.outputDirectory, file_name, mimetype="video/mp4",
+        as_attachment=bool(download_name), download_name=download_name
+    )
+
+def deliver_output(file_name, download_name, as_attachment):
+    """Hand an authorized output to the configured delivery path, all of them honour Range requests"""
+    if Config.deliveryMode == "x-accel":
+        # nginx streams the file from an internal location, the worker is free immediately
+        response = Response(mimetype="video/mp4")
+        response.headers["X-Accel-Redirect"] = Config.accelRedirectPrefix + file_name
+        if as_attachment:
+            response.headers["Content-Disposition"] = f'attachment; filename="{download_name}"'
+        return response
+
+    if Config.deliveryMode == "signed":
+        url = Config.signedUrlBase.rstrip("/") + "/" + file_name
+        expires = int(time.time()) + Config.signedUrlSeconds
+        query = {"md5": sign_media_path(urlparse(url).path, expires), "expires": expires}
+        if as_attachment:
+            query["download"] = download_name
+        response = redirect(f"{url}?{urlencode(query)}")
+        response.headers["Cache-Control"] = "private, no-store"
+        return response
+
+    # USE_X_SENDFILE turns this into an X-Sendfile header in "x-sendfile" mode
+    return send_from_directory(Config.outputDirectory, file_name, as_attachment=as_attachment, mimetype="video/mp4", download_name=download_name)
+
+def output_file_name(id):
+    """Output file of the user's completed job, shared renders point at another job's file"""
     query = """
     SELECT
-        *
+        vj.output_file
     FROM 
         video_jobs vj 
     WHERE
         vj.user_id = %s AND vj.status = 'completed' AND vj.id = %s;
     """
-    rows = fetch(query, args=(session["user_id"], id))
-    if not rows:
+    row = fetch(query, args=(session["user_id"], id), one=True)
+    if not row:
         abort(404)
-
-   # Ensure the file exists on disk
-    video_path = os.path.join(Config.outputDirectory, id + ".mp4")
-    if not os.path.exists(video_path):
-        abort(404, "File not found")
-    
-    as_attachment = request.args.get("attachment", "false").lower() == "true"
-    return send_from_directory(Config.outputDirectory, id + ".mp4",as_attachment=as_attachment, mimetype="video/mp4")
+    return row.get("output_file") or id + ".mp4"
+
+def cached_file(directory, file_name, private=False):
+    """Send a file with a strong ETag and Cache-Control, answering conditional GETs with 304"""
+    response = send_from_directory(directory, file_name, max_age=Config.thumbnailMaxAge, etag=True, conditional=True)
+    if private:
+        # Per user content, generated once and never rewritten
+        response.cache_control.public = False
+        response.cache_control.private = True
+        response.cache_control.immutable = True
+    return response
   
 @app.route("/authorize")
 def oauth2_authorize():
@@ -412,6 +492,14 @@ def logout():
     # Redirect user to login form
     return redirect("/")
 
+@app.route("/metrics")
+def prometheus_metrics():
+    """Prometheus scrape endpoint, workers push their gauges through redis"""
+    if Config.metricsToken and request.headers.get("Authorization") != f"Bearer {Config.metricsToken}":
+        abort(401)
+    metrics.report_process("web")
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
 @app.route("/webhook")
 def igverify():
     if request.args.get("hub.mode") == "subscribe" and request.args.get("hub.challenge"):
@@ -427,6 +515,11 @@ def webhook():
     if not request.is_json:
         return "Got /webhook but it's not json", 400
     
+    if Config.webhookIngestMode == "stream":
+        # Signature is verified, webhook_consumer.py does the rest
+        redis_client.xadd(Config.webhookStream, {"body": request.get_data()}, maxlen=Config.webhookStreamMaxLen, approximate=True)
+        return "EVENT_RECEIVED", 200
+    
     # Get the JSON data from the request
     body = request.get_json()
     app.logger.info("\033[32mReceived webhook\033[0m")
@@ -448,11 +541,19 @@ def internal_error(error):
 
 @app.teardown_request
 def return_db_connection(exception=None):
-    db_conn = g.pop('db_conn', None)
-    if db_conn:
-        conn_pool.putconn(db_conn)
+    db_app.release_connection()
         
 def process_ig_webhook(body):
+    claimed = []
+    try:
+        _process_ig_webhook(body, claimed)
+    except Exception:
+        # The body will be delivered again, it must not look like a duplicate then
+        if claimed:
+            redis_client.delete(*(f"webhook_mid:{mid}" for mid in claimed))
+        raise
+
+def _process_ig_webhook(body, claimed):
     for entry in body.get("entry", []):
         if "messaging" not in entry:
             app.logger.info("No messaging field in entry. Possibly a webhook test.")
@@ -463,10 +564,18 @@ def process_ig_webhook(body):
                 app.logger.info("Got an echo")
                 return
             
+            # Meta retries deliveries, handle each message once
+            mid = webhookEvent.get("message", {}).get("mid")
+            if mid and not redis_client.set(f"webhook_mid:{mid}", 1, nx=True, ex=Config.webhookDedupeTtl):
+                app.logger.info(f"Duplicate message {mid}")
+                continue
+            if mid:
+                claimed.append(mid)
+            
             # Get the sender IGSID
             senderIgsid = webhookEvent["sender"]["id"]
-            rows = fetch("SELECT * FROM users WHERE ig_id = %s;", args=(senderIgsid,))
-            if not rows:
+            user = user_cache.get_user_by_ig_id(db_app, senderIgsid)
+            if not user:
                 graph_api = GraphApi()
                 user_profile = graph_api.getUserProfile(senderIgsid)
                 if user_profile and "username" in user_profile:
@@ -475,14 +584,14 @@ def process_ig_webhook(body):
                         args=(senderIgsid, user_profile["username"].lower())
                     )
                     if update_count:
-                        rows = fetch("SELECT * FROM users WHERE ig_id = %s;", args=(senderIgsid,))
+                        user = user_cache.get_user_by_ig_id(db_app, senderIgsid)
                     else:
                         send_ig_reply(senderIgsid, "Signup to autosplit!")
                         return 
                 else:
                     return 
             
-            user_configs = fetch("SELECT * FROM video_configurations WHERE user_id = %s;", args=(rows[0]["id"],))
+            user_configs = user_cache.get_configs(db_app, user["id"])
             if not user_configs:
                 send_ig_reply(senderIgsid, "No video configurations found. Set up a new one now to customize your video edits")
                 return 
@@ -497,14 +606,13 @@ def process_ig_webhook(body):
                         payload["type"] = "attachment"
 
                         # Instruct a default task to to process the video inside redis if no configuration name arrives in 20     
-                        task_obj = default_ig_process.apply_async(args=[senderIgsid, rows[0], payload, user_configs], countdown=Config.countdown)
+                        task_obj = default_ig_process.apply_async(args=[senderIgsid, user["id"], payload], countdown=Config.countdown)
                         app.logger.info(f"task_id: {task_obj.id} will start after 20sec...")
                         
                         task_data = {"task_id": task_obj.id, "payload": payload, "timestamp": webhookEvent["timestamp"]}
                         # Save the payload inside redis until a configuration name arrives
                         app.logger.info(f"Set task_id: {task_obj.id} into redis")
-                        # TODO: need to add key expiration
-                        redis_client.set(f"{senderIgsid}_{payload['reel_video_id']}", json.dumps(task_data))
+                        PendingTasks(senderIgsid).add(payload, task_data, webhookEvent["timestamp"])
                 
                 elif message.get("text"):
                     msg = message["text"].strip()
@@ -518,28 +626,19 @@ def process_ig_webhook(body):
                         if link:
                             payload = {"url": link, "type": "link"}
                             # Instruct a default task to to process the video inside redis if no configuration name arrives in 20     
-                            task_obj = default_ig_process.apply_async(args=[senderIgsid, rows[0], payload, user_configs], countdown=Config.countdown)
+                            task_obj = default_ig_process.apply_async(args=[senderIgsid, user["id"], payload], countdown=Config.countdown)
                             app.logger.info(f"task_id: {task_obj.id} will start after 20sec...")
                             
                             task_data = {"task_id": task_obj.id, "payload": payload, "timestamp": webhookEvent["timestamp"]}
                             # Save the payload inside redis until a configuration name arrives
                             app.logger.info(f"Set task_id: {task_obj.id} into redis")
-                            # TODO: need to add key expiration
-                            redis_client.set(f"{senderIgsid}_{payload['url']}", json.dumps(task_data))
+                            PendingTasks(senderIgsid).add(payload, task_data, webhookEvent["timestamp"])
                         else:
                             send_ig_reply(senderIgsid, "Configuration doesn't exists")
                         return 
                     
-                    current_task = None
-                    max_timestamp = float('-inf')
-                    # Get all reels sent by user
-                    for key in redis_client.scan_iter(f"{senderIgsid}_*"):
-                        task_data = redis_client.get(key)
-                        if task_data:
-                            task = json.loads(task_data)
-                            if task["timestamp"] > max_timestamp:
-                                current_task = task
-                                max_timestamp = task["timestamp"]
+                    # Take the latest reel sent by user
+                    current_task = PendingTasks(senderIgsid).claim_latest()
                     
                     if current_task:       
                         task_id = current_task['task_id']
@@ -548,21 +647,26 @@ def process_ig_webhook(body):
                         task_obj.revoke(terminate=True)
                         app.logger.info(f"Task {task_id} revoked.")
                         
-                        # Delete task from redis
-                        app.logger.info(f"Delete task with id: {current_task.get('task_id')} from redis...")
-                        if current_task["payload"]["type"] == "attachment":
-                            redis_client.delete(f"{senderIgsid}_{current_task['payload']['reel_video_id']}")
-                        else:
-                            redis_client.delete(f"{senderIgsid}_{current_task['payload']['url']}")
-                        ig_process.delay(rows[0], current_task["payload"], config)
+                        ig_process.delay(user["id"], current_task["payload"], config["id"])
                     
 @celery.task
-def default_ig_process(senderIgsid, user, payload, configs):
-    # Delete the reel video from redis
-    if payload["type"] == "attachment":
-        redis_client.delete(f"{senderIgsid}_{payload['reel_video_id']}")
-    else:
-        redis_client.delete(f"{senderIgsid}_{payload['url']}")
+def default_ig_process(senderIgsid, user_id, payload):
+    # A config name arrived first and already took the reel
+    pending = PendingTasks(senderIgsid)
+    if pending.claim(payload) is None:
+        if pending.was_claimed(payload):
+            app.logger.info(f"Reel already claimed for {senderIgsid}")
+            return
+        # The entry expired while this task was queued, the reel is still ours
+        app.logger.warning(f"Pending reel expired before the default task ran for {senderIgsid}")
+    
+    worker_db = db()
+    try:
+        user = user_cache.get_user(worker_db, user_id)
+        configs = user_cache.get_configs(worker_db, user_id)
+    finally:
+        worker_db.put_connection()
+    
     # Check user have default config            
     if user.get("default_config_id"): 
         for config in configs:
@@ -575,11 +679,34 @@ def default_ig_process(senderIgsid, user, payload, configs):
         send_ig_reply(senderIgsid, f"No default configuration for user: {user['email']}")
             
 @celery.task   
-def ig_process(user, payload, config_name):
-    app.logger.info(f"{config_name} config processing video url: {payload['url']}")
-    vid_ps = VideoProcessor(user, payload, config_name)
+def ig_process(user_id, payload, config_id):
+    worker_db = db()
+    try:
+        user = user_cache.get_user(worker_db, user_id)
+        config = user_cache.get_config(worker_db, user_id, config_id)
+    finally:
+        worker_db.put_connection()
+    
+    if not config:
+        app.logger.info(f"Config {config_id} no longer exists")
+        return
+    app.logger.info(f"{config['config_name']} config processing video url: {payload['url']}")
+    vid_ps = VideoProcessor(user, payload, config)
     vid_ps.start_process() 
     
+@celery.task
+def warm_renditions(config, gameplay_ids):
+    RenditionCache().warm(config, gameplay_ids)
+    
+@celery.task
+def cleanup_render_outputs():
+    worker_db = db()
+    try:
+        removed = RenderIndex.cleanup(worker_db)
+        app.logger.info(f"Removed {removed} unreferenced outputs")
+    finally:
+        worker_db.put_connection()
+    
 def send_ig_reply(igId, message):
     receive_message = Receive(igId)
     receive_message.handleMessage(message)
@@ -0,0 +1,32 @@
+import os
+import sys
+import subprocess
+
+# Benchmarks import the application modules from the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from moviepy.config import FFMPEG_BINARY
+
+def synthesize(path, size, seconds, fps, source="testsrc2", audio=False):
+    """Write a lavfi test pattern as H.264, keyframe every second"""
+    subprocess.run([
+        FFMPEG_BINARY, "-y", "-loglevel", "error",
+        "-f", "lavfi", "-i", f"{source}=size={size[0]}x{size[1]}:rate={fps}:duration={seconds}",
+        *(["-f", "lavfi", "-i", f"sine=frequency=440:duration={seconds}", "-c:a", "aac"] if audio else []),
+        "-c:v", "libx264", "-preset", "ultrafast", "-pix_fmt", "yuv420p", "-g", str(fps),
+        path
+    ], check=True)
+    return path
+
+def media(size, seconds, fps, has_audio=False):
+    """Metadata as media_probe stores it, so no ffprobe is needed"""
+    return {
+        "width": size[0], "height": size[1], "fps": fps, "codec": "h264", "rotation": 0,
+        "has_audio": has_audio, "audio_codec": "aac" if has_audio else None,
+        "duration": seconds, "keyframes": [float(second) for second in range(int(seconds))]
+    }
+
+def table(rows, headers):
+    widths = [max(len(str(value)) for value in column) for column in zip(headers, *rows)]
+    for row in (headers, *rows):
+        print("  ".join(str(value).ljust(width) for value, width in zip(row, widths)))
@@ -0,0 +1,64 @@
+"""Frames per second and transient allocation per frame of the MoviePy compositors
+
+    python bench/compositor.py [--seconds 5] [--fps 30] [--width 1080] [--height 1920]
+
+Frames are only produced, not encoded, so the numbers isolate decoding and compositing.
+"""
+import argparse
+import tempfile
+import time
+import tracemalloc
+import os
+from common import synthesize, media, table
+from config import Config
+from editor import Editor
+
+CONFIG = {"split_type": "horizontal", "video_position": "top", "edit_type": "crop", "original_video_percentage": 50, "max_resolution": "source"}
+
+def run(compositor, main, gameplay, args):
+    Config.moviepyCompositor = compositor
+    size = (args.width, args.height)
+    editor = Editor(
+        main, gameplay, CONFIG,
+        media=media(size, args.seconds, args.fps), gameplay_media=media(size, args.seconds, args.fps)
+    )
+    duration = editor.duration
+    clip = editor._composited_clip(duration) if compositor == "numpy" else editor._clips_array_clip()
+
+    frames, transient = 0, 0
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        for frame in clip.iter_frames(fps=args.fps, dtype="uint8"):
+            # Peak above what is still live afterwards is what the frame allocated and threw away
+            current, peak = tracemalloc.get_traced_memory()
+            transient += peak - current
+            tracemalloc.reset_peak()
+            frames += 1
+    finally:
+        seconds = time.perf_counter() - start
+        tracemalloc.stop()
+        editor._cleanup()
+    return frames, seconds, transient / frames if frames else 0
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=int, default=5)
+    parser.add_argument("--fps", type=int, default=30)
+    parser.add_argument("--width", type=int, default=1080)
+    parser.add_argument("--height", type=int, default=1920)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        size = (args.width, args.height)
+        main_path = synthesize(os.path.join(directory, "main.mp4"), size, args.seconds, args.fps, source="testsrc")
+        gameplay_path = synthesize(os.path.join(directory, "gameplay.mp4"), size, args.seconds, args.fps)
+
+        rows = []
+        for compositor in ("clips_array", "numpy"):
+            frames, seconds, transient = run(compositor, main_path, gameplay_path, args)
+            rows.append((compositor, frames, f"{frames / seconds:.1f}", f"{transient / 1024 ** 2:.2f}"))
+        table(rows, ("compositor", "frames", "frames/s", "MiB allocated/frame"))
+
+if __name__ == "__main__":
+    main()
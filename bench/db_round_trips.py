@@ -0,0 +1,70 @@
+"""Single-row statements against the bulk and transaction helpers on a real Postgres
+
+    python bench/db_round_trips.py [--rows 50] [--repeat 20]
+
+Connects with the DB_* settings in the environment, all writes go to a temporary table.
+"""
+import argparse
+import math
+import time
+from common import table
+from config import Config
+from bg_db import db
+
+def timed(repeat, function):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=50, help="rows per bulk insert, like gameplays per config")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    bench_db = db()
+    try:
+        # Lives on this session's connection only
+        bench_db.update("CREATE TEMP TABLE bench_rows (id SERIAL PRIMARY KEY, config_id TEXT, gameplay_id TEXT, status TEXT, caption TEXT, gameplay TEXT, download_bytes BIGINT);")
+        rows = [("config", f"gameplay-{i}") for i in range(args.rows)]
+        bench_db.update("INSERT INTO bench_rows (config_id, status) VALUES ('job', 'pending');")
+        pages = math.ceil(args.rows / Config.dbBatchPageSize)
+
+        def single_rows():
+            for row in rows:
+                bench_db.update("INSERT INTO bench_rows (config_id, gameplay_id) VALUES (%s, %s);", args=row)
+
+        def batched_rows():
+            bench_db.execute_many("INSERT INTO bench_rows (config_id, gameplay_id) VALUES (%s, %s);", rows)
+
+        def values_rows():
+            bench_db.execute_values("INSERT INTO bench_rows (config_id, gameplay_id) VALUES %s;", rows)
+
+        # One job's column writes, each committed on its own as before or buffered into the status UPDATE
+        def job_single():
+            bench_db.update("UPDATE bench_rows SET gameplay = %s WHERE config_id = 'job';", args=("gameplay",))
+            bench_db.update("UPDATE bench_rows SET caption = %s WHERE config_id = 'job';", args=("caption",))
+            bench_db.update("UPDATE bench_rows SET download_bytes = %s WHERE config_id = 'job';", args=(1024,))
+            bench_db.update("UPDATE bench_rows SET status = %s WHERE config_id = 'job';", args=("downloaded",))
+
+        def job_buffered():
+            with bench_db.transaction() as cur:
+                cur.execute(
+                    "UPDATE bench_rows SET gameplay = %s, caption = %s, download_bytes = %s, status = %s WHERE config_id = 'job';",
+                    ("gameplay", "caption", 1024, "downloaded")
+                )
+
+        results = [
+            (f"{args.rows} inserts, one commit each", 2 * args.rows, timed(args.repeat, single_rows)),
+            (f"{args.rows} inserts, execute_many", pages + 1, timed(args.repeat, batched_rows)),
+            (f"{args.rows} inserts, execute_values", pages + 1, timed(args.repeat, values_rows)),
+            ("job columns, 4 UPDATEs", 8, timed(args.repeat, job_single)),
+            ("job columns, 1 UPDATE", 2, timed(args.repeat, job_buffered))
+        ]
+        table([(name, trips, f"{ms:.2f}") for name, trips, ms in results], ("operation", "round trips", "ms"))
+    finally:
+        bench_db.put_connection()
+
+if __name__ == "__main__":
+    main()
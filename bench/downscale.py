@@ -0,0 +1,50 @@
+"""Render time of a 4K source at its own size against downscale-first to the 1080p limit
+
+    python bench/downscale.py [--engine ffmpeg] [--seconds 3] [--fps 30]
+
+Both runs use the same source, gameplay, split and encoding profile, only max_resolution differs.
+"""
+import argparse
+import tempfile
+import time
+import os
+from common import synthesize, media, table
+from config import Config
+from video_processor import RENDER_ENGINES
+
+SOURCE_SIZE = (2160, 3840)
+GAMEPLAY_SIZE = (1080, 1920)
+CONFIG = {"split_type": "horizontal", "video_position": "top", "edit_type": "crop", "original_video_percentage": 50, "encoding_profile": "draft"}
+
+def run(engine, max_resolution, main, gameplay, args):
+    config = {**CONFIG, "max_resolution": max_resolution}
+    editor = RENDER_ENGINES[engine](
+        main, gameplay, config,
+        media=media(SOURCE_SIZE, args.seconds, args.fps, has_audio=True),
+        gameplay_media=media(GAMEPLAY_SIZE, args.seconds, args.fps)
+    )
+    start = time.perf_counter()
+    editor.start_editing(f"bench-{engine}-{max_resolution}")
+    return time.perf_counter() - start, editor.width * editor.height
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--engine", choices=RENDER_ENGINES, default="ffmpeg")
+    parser.add_argument("--seconds", type=int, default=3)
+    parser.add_argument("--fps", type=int, default=30)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        Config.outputDirectory = directory
+        main_path = synthesize(os.path.join(directory, "main.mp4"), SOURCE_SIZE, args.seconds, args.fps, source="testsrc", audio=True)
+        gameplay_path = synthesize(os.path.join(directory, "gameplay.mp4"), GAMEPLAY_SIZE, args.seconds, args.fps)
+
+        rows = []
+        frames = args.seconds * args.fps
+        for max_resolution in ("source", Config.defaultOutputResolution):
+            seconds, pixels = run(args.engine, max_resolution, main_path, gameplay_path, args)
+            rows.append((max_resolution, f"{pixels / 1e6:.2f}", f"{seconds:.2f}", f"{frames / seconds:.1f}"))
+        table(rows, ("max_resolution", "Mpixels/frame", "seconds", "frames/s"))
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,8 @@
 from config import Config
 from db_pool import conn_pool
+import prepared
+from contextlib import contextmanager
+from psycopg2.extras import execute_batch, execute_values
 import logging
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -11,7 +14,7 @@ class db:
     def get_connection(self):
         """Get a connection from pool"""
         if self.conn is None:
-            return conn_pool.getconn()
+            self.conn = conn_pool.getconn()
         return self.conn
     
     def put_connection(self):
@@ -44,4 +47,72 @@ class db:
     def update(self, query, args=()):
         """Update or Delete or Insert records"""
         with self.execute(query, args, commit=True) as cur:
-            return cur.rowcount
\ No newline at end of file
+            return cur.rowcount
+
+    def execute_named(self, name, args=(), commit=False):
+        """Execute a registered prepared query and return cursor"""
+        conn = self.get_connection()
+        try:
+            cur = prepared.execute(conn.cursor(), name, args)
+            if commit:
+                conn.commit()
+            return cur
+        except Exception as e:
+            conn.rollback()
+            logging.error(f"Database error: {e}")
+            raise
+
+    def fetch_named(self, name, args=(), one=False):
+        """Fetch results of a registered prepared query as dictionaries"""
+        with self.execute_named(name, args) as cur:
+            columns = [desc[0] for desc in cur.description]
+            results = [dict(zip(columns, row)) for row in cur.fetchall()]
+            return results[0] if (one and results) else results
+
+    def update_named(self, name, args=()):
+        """Run a registered prepared write and return the row count"""
+        with self.execute_named(name, args, commit=True) as cur:
+            return cur.rowcount
+
+    @contextmanager
+    def transaction(self):
+        """Run several statements on one connection and commit once"""
+        conn = self.get_connection()
+        try:
+            with conn.cursor() as cur:
+                yield cur
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            logging.error(f"Database error: {e}")
+            raise
+
+    def execute_many(self, query, args_list, commit=True):
+        """Run one statement for many argument tuples in a few round trips"""
+        conn = self.get_connection()
+        try:
+            with conn.cursor() as cur:
+                execute_batch(cur, query, args_list, page_size=Config.dbBatchPageSize)
+                rowcount = cur.rowcount
+            if commit:
+                conn.commit()
+            return rowcount
+        except Exception as e:
+            conn.rollback()
+            logging.error(f"Database error: {e}")
+            raise
+
+    def execute_values(self, query, rows, commit=True):
+        """Expand rows into a single multi-row VALUES %s statement"""
+        conn = self.get_connection()
+        try:
+            with conn.cursor() as cur:
+                execute_values(cur, query, rows, page_size=Config.dbBatchPageSize)
+                rowcount = cur.rowcount
+            if commit:
+                conn.commit()
+            return rowcount
+        except Exception as e:
+            conn.rollback()
+            logging.error(f"Database error: {e}")
+            raise
@@ -0,0 +1,126 @@
+import subprocess
+import logging
+import numpy as np
+from config import Config
+from encoding import ffmpeg_loop_input
+from moviepy.config import FFMPEG_BINARY
+import rusage
+
+# Setup logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+class FrameReader:
+    """Frames of one video decoded, filtered and converted to RGB by ffmpeg, read in order from a pipe"""
+
+    def __init__(self, path, size, fps, filters=(), start=0.0, duration=None, loop=False) -> None:
+        self.path = path
+        # Frame size after the filters
+        self.width, self.height = size
+        self.fps = fps
+        self.filters = list(filters)
+        self.start = start
+        self.duration = duration
+        self.loop = loop
+        self.process = None
+        # Index of the next frame the pipe delivers
+        self.index = 0
+        self.eof = False
+        # Only allocated for targets that aren't one contiguous block
+        self._scratch = None
+
+    def read_to(self, index, out):
+        """Fill out with frame index, out must be the same array on every call"""
+        if self.process is not None and index == self.index - 1:
+            # out still holds it
+            return
+        # Reading through is cheaper than a seek for short gaps
+        if self.process is None or index < self.index or index - self.index > Config.readAheadFrames:
+            self._seek(index)
+        while self.index <= index:
+            self._read(out)
+            self.index += 1
+
+    def close(self):
+        if self.process:
+            self.process.kill()
+            rusage.wait(self.process)
+            self.process = None
+
+    def _seek(self, index):
+        self.close()
+        offset = self.start + index / self.fps
+        if self.loop and self.duration:
+            offset %= self.duration
+        # Looping readers continue from the file start after the end, not from the seek point
+        if self.loop:
+            inputs, source = ffmpeg_loop_input(self.path, offset, 0)
+        else:
+            inputs, source = ["-ss", f"{offset:.3f}", "-i", self.path], "[0:v]"
+        self.process = subprocess.Popen([
+            FFMPEG_BINARY, "-loglevel", "error",
+            *inputs,
+            "-an", "-filter_complex", source + ",".join([f"fps={self.fps:g}", *self.filters]),
+            "-f", "rawvideo", "-pix_fmt", "rgb24", "-"
+        ], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        self.index = index
+        self.eof = False
+
+    def _read(self, out):
+        if self.eof:
+            # The container ended a frame or two before the timeline, hold the last frame
+            return
+        if out.flags.c_contiguous:
+            # Straight from the pipe into the caller's buffer
+            target = out
+        else:
+            if self._scratch is None:
+                self._scratch = np.empty((self.height, self.width, 3), dtype=np.uint8)
+            target = self._scratch
+
+        view = memoryview(target).cast("B")
+        filled = 0
+        while filled < len(view):
+            count = self.process.stdout.readinto(view[filled:])
+            if not count:
+                if self.loop or filled:
+                    raise IOError(f"{self.path} ended early at frame {self.index}")
+                self.eof = True
+                return
+            filled += count
+
+        if target is not out:
+            np.copyto(out, target)
+
+class SplitCompositor:
+    """Two-pane split-screen frames assembled in one buffer reused for the whole render"""
+
+    def __init__(self, layout, main_reader, gameplay_reader) -> None:
+        self.main_reader = main_reader
+        self.gameplay_reader = gameplay_reader
+
+        main_size = (main_reader.width, main_reader.height)
+        gameplay_size = (gameplay_reader.width, gameplay_reader.height)
+        first, second = (main_size, gameplay_size) if layout["main_first"] else (gameplay_size, main_size)
+        if layout["stack"] == "vstack":
+            self.canvas = np.empty((first[1] + second[1], first[0], 3), dtype=np.uint8)
+            # Row bands, each one contiguous so decoders write straight into it
+            panes = (self.canvas[:first[1]], self.canvas[first[1]:])
+        else:
+            self.canvas = np.empty((first[1], first[0] + second[0], 3), dtype=np.uint8)
+            panes = (self.canvas[:, :first[0]], self.canvas[:, first[0]:])
+        self.main_pane, self.gameplay_pane = panes if layout["main_first"] else panes[::-1]
+
+    @property
+    def size(self):
+        return self.canvas.shape[1], self.canvas.shape[0]
+
+    def frame(self, t):
+        """Frame at t, always the same array overwritten in place"""
+        index = int(t * self.main_reader.fps + 1e-6)
+        self.main_reader.read_to(index, self.main_pane)
+        self.gameplay_reader.read_to(index, self.gameplay_pane)
+        return self.canvas
+
+    def close(self):
+        self.main_reader.close()
+        self.gameplay_reader.close()
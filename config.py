@@ -5,23 +5,158 @@ load_dotenv()  # take environment variables from .env.
 class Config:
     # Default countdown
     countdown = 20
+    # Extra seconds pending reels stay in redis after the countdown
+    pendingTaskTtlMargin = 60
+    # Seconds a config name claim is remembered, far longer than any queue delay
+    pendingClaimTtl = 24 * 3600
     # Reels download directory
     reelsDirectory = "reels"
     # Gameplay video directory
     gameplayDirectory = "gameplays"
     # Output video directory
     outputDirectory= "outputs"
+    # Pre-scaled gameplay renditions directory
+    renditionDirectory = "renditions"
+    # Evict least recently used renditions above this size
+    renditionCacheMaxBytes = 5 * 1024 ** 3
+    # Renditions used this recently may still be read by a render and are never evicted
+    renditionInUseSeconds = 3 * 3600
+    # A build holds a redis lock others poll on, it expires in case the builder dies
+    renditionBuildLockSeconds = 30 * 60
+    renditionBuildPollSeconds = 1
+    # Main video sizes renditions are prepared for when a config is created
+    renditionPrewarmSizes = [(1080, 1920)]
      
     # Gameplay thumbnail path
     thumbnailPath = "thumbnail"
+    # Output posters and animated previews, taken posterPosition into the video
+    posterPosition = 0.1
+    posterWidth = 540
+    previewSeconds = 3
+    previewFps = 10
+    previewWidth = 240
+    # Browser cache lifetime of thumbnails and posters, in seconds
+    thumbnailMaxAge = 24 * 3600
+    # How output videos reach the browser once a request is authorized, "flask" streams them
+    # from the worker, "x-accel" hands them to nginx with X-Accel-Redirect, "x-sendfile"
+    # to Apache/lighttpd with X-Sendfile, "signed" redirects to a short lived signed URL
+    # in the format of nginx's secure_link module
+    deliveryMode = os.environ.get("DELIVERY_MODE", "flask")
+    # nginx internal location aliased to outputDirectory
+    accelRedirectPrefix = "/protected/outputs/"
+    # Base of signed URLs, files are served from <base>/<file_name>
+    signedUrlBase = os.environ.get("SIGNED_URL_BASE", "/media/")
+    signedUrlSeconds = 300
+    
+    # Rendering engine, "moviepy" composites frame by frame, "ffmpeg" runs one filter graph,
+    # "ffmpeg-segmented" renders long videos as parallel ffmpeg segments
+    renderEngine = os.environ.get("RENDER_ENGINE", "moviepy")
+    ffprobeBinary = os.environ.get("FFPROBE_BINARY", "ffprobe")
+    # Segmented rendering, videos shorter than segmentMinSeconds render in one piece
+    segmentSeconds = 15
+    segmentMinSeconds = 45
+    # Parallel segment encoders per render, they share the cores through a per-process thread cap
+    segmentWorkers = min(4, os.cpu_count())
+    # MoviePy engine compositing, "numpy" assembles frames in one reused buffer fed by
+    # ffmpeg pipes, "clips_array" is MoviePy's own clip tree
+    moviepyCompositor = os.environ.get("MOVIEPY_COMPOSITOR", "numpy")
+    # Piped frames are read through rather than seeked to when this close ahead
+    readAheadFrames = 60
+    # Sources outside these limits are rejected right after download
+    sourceMaxSeconds = 15 * 60
+    sourceMinDimension = 64
+    
+    # Encoding profiles, output fps always follows the source video
+    # Set either crf (constant quality) or bitrate, threads 0 lets the encoder decide
+    encodingProfiles = {
+        "draft": {"codec": "libx264", "crf": 28, "bitrate": None, "preset": "veryfast", "threads": 0},
+        "standard": {"codec": "libx264", "crf": 20, "bitrate": None, "preset": "medium", "threads": 0},
+        "archive": {"codec": "libx264", "crf": None, "bitrate": "15M", "preset": "slow", "threads": 0}
+    }
+    defaultEncodingProfile = "standard"
+    # Largest output per config as (short, long) edges in either orientation, None keeps the source size
+    # Sources above it are scaled down as they're decoded, before any crop or composite
+    outputResolutions = {
+        "720p": (720, 1280),
+        "1080p": (1080, 1920),
+        "1440p": (1440, 2560),
+        "source": None
+    }
+    defaultOutputResolution = "1080p"
+    # Source audio codecs muxed into MP4 outputs as is, anything else is encoded to AAC
+    mp4AudioCodecs = ("aac", "mp3", "ac3", "eac3", "alac")
+    
+    # Downloader limits, timeouts are (connect, read) seconds
+    downloadMaxBytes = 500 * 1024 ** 2
+    downloadTimeout = (10, 30)
+    downloadRetries = 3
+    downloadChunkSize = 1024 ** 2
+    # Files above this size are fetched over several ranged connections
+    downloadParallelMinBytes = 16 * 1024 ** 2
+    downloadConnections = 4
     
     gameplayPerPage = 6
     outputPerPage = 8
+    progressPerPage = 25
+    # Redis used for caches and pending tasks
+    redisHost = '127.0.0.1'
+    redisPort = 6379
+    redisDb = 0
+    # User and config cache, redis entries live userCacheTtl seconds and the
+    # in-process tier localCacheTtl seconds
+    userCacheTtl = 300
+    localCacheTtl = 5
+    localCacheSize = 1024
+    # Content addressed download cache
+    downloadCacheDirectory = "download_cache"
+    downloadCacheTtl = 7 * 24 * 3600
+    downloadCacheMaxBytes = 10 * 1024 ** 3
+    # Webhook ingestion, "inline" handles events in the request, "stream" queues them
+    # in a Redis Stream for webhook_consumer.py
+    webhookIngestMode = os.environ.get("WEBHOOK_INGEST_MODE", "inline")
+    webhookStream = "webhook_events"
+    webhookStreamMaxLen = 100000
+    webhookGroup = "webhook_consumers"
+    # Entries left unacknowledged this long are taken over by another consumer
+    webhookClaimIdleMs = 60000
+    webhookDedupeTtl = 24 * 3600
+    # Live job updates, render progress is published at most every progressMinStep of the
+    # timeline and the event stream sends a keepalive after sseKeepaliveSeconds of silence
+    progressMinStep = 0.02
+    sseKeepaliveSeconds = 15
+    # Each open stream holds a web worker thread and a redis connection, so it ends after
+    # sseMaxSeconds and the browser reconnects. Serve the app with threaded or gevent
+    # workers (gunicorn --threads/-k gevent), sync workers are taken by one tab each
+    sseMaxSeconds = 300
+    # Per process gauges pushed to redis for /metrics expire after this many seconds,
+    # METRICS_TOKEN when set must be sent as a bearer token to scrape
+    metricsProcessTtl = 300
+    metricsToken = os.environ.get("METRICS_TOKEN")
+    # Seconds between sweeps of rendered outputs no job references
+    renderCleanupInterval = 3600
     # Configure message broker
     celeryBrokerUrl = 'redis://localhost:6379/0'
     celeryResultBackend = 'redis://localhost:6379/0'
+    # Worker settings per queue, start one worker per queue with
+    # CELERY_WORKER_QUEUE=render celery -A app.celery worker -Q render
+    # Outputs, reels and renditions must be on storage every worker shares
+    celeryQueues = {
+        "celery": {"concurrency": 4, "prefetch": 4},
+        "download": {"concurrency": 32, "prefetch": 4},
+        "render": {"concurrency": os.cpu_count(), "prefetch": 1},
+        "messaging": {"concurrency": 16, "prefetch": 8}
+    }
+    celeryRoutes = {
+        "video_processor.download_stage": "download",
+        "video_processor.prepare_stage": "download",
+        "video_processor.render_stage": "render",
+        "app.warm_renditions": "render",
+        "video_processor.finalize_stage": "messaging"
+    }
     # Application Config
     secretKey = os.environ["SECRET_KEY"]
+    # Shared with the proxy that checks signed media URLs
+    mediaSigningKey = os.environ.get("MEDIA_SIGNING_KEY", secretKey)
     # Google oauth configs
     googleAuth = {
         "clientId": os.environ["GOOGLE_CLIENT_ID"],
@@ -50,4 +185,14 @@ class Config:
     dbHost = os.environ["DB_HOST"]
     dbPort = os.environ["DB_PORT"]
     dbMinConn = 1
-    dbMaxConn = 20
\ No newline at end of file
+    dbMaxConn = 20
+    # Seconds to wait for a free connection before giving up
+    dbCheckoutTimeout = 10
+    # Connections idle longer than this are pinged before being handed out
+    dbPrePingAfter = 30
+    # Connections held longer than this are reported as leaked
+    dbLeakSeconds = 300
+    # Rows sent per round trip by the bulk helpers
+    dbBatchPageSize = 100
+    # Log prepared query stats every this many executions
+    dbStatsLogEvery = 1000
\ No newline at end of file
@@ -1,5 +1,7 @@
+import os
 from celery import Celery, Task
 from flask import Flask
+from kombu import Queue
 from config import Config
 
 def celery_init_app(app: Flask) -> Celery:
@@ -9,7 +11,22 @@ def celery_init_app(app: Flask) -> Celery:
                 return self.run(*args, **kwargs)
 
     celery_app = Celery(app.name, broker=Config.celeryBrokerUrl, task_cls=FlaskTask)
-    celery_app.conf.update({"CELERY_RESULT_BACKEND": Config.celeryResultBackend})
+    celery_app.conf.update({"result_backend": Config.celeryResultBackend})
+    # Separate queues keep quick downloads and replies from waiting behind renders
+    celery_app.conf.task_queues = [Queue(name) for name in Config.celeryQueues]
+    celery_app.conf.task_default_queue = "celery"
+    celery_app.conf.task_routes = {task: {"queue": queue} for task, queue in Config.celeryRoutes.items()}
+
+    # A worker started for one queue takes that queue's concurrency and prefetch
+    worker_queue = os.environ.get("CELERY_WORKER_QUEUE")
+    if worker_queue in Config.celeryQueues:
+        celery_app.conf.worker_concurrency = Config.celeryQueues[worker_queue]["concurrency"]
+        celery_app.conf.worker_prefetch_multiplier = Config.celeryQueues[worker_queue]["prefetch"]
+
+    # Periodic tasks, run with `celery -A app.celery beat`
+    celery_app.conf.beat_schedule = {
+        "cleanup-render-outputs": {"task": "app.cleanup_render_outputs", "schedule": Config.renderCleanupInterval}
+    }
     celery_app.set_default()
     app.extensions["celery"] = celery_app
     return celery_app
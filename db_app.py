@@ -1,6 +1,9 @@
 from flask import g, current_app
+from contextlib import contextmanager
+from psycopg2.extras import execute_batch, execute_values as _execute_values
 from config import Config
 from db_pool import conn_pool
+import prepared
 
 def get_connection():
     """Get a connection from pool"""
@@ -8,6 +11,21 @@ def get_connection():
         g.db_conn = conn_pool.getconn()
     return g.db_conn
 
+def release_connection():
+    """Return the context's connection to the pool, if it took one"""
+    db_conn = g.pop('db_conn', None)
+    if db_conn:
+        conn_pool.putconn(db_conn)
+
+@contextmanager
+def app_context(app):
+    """App context for work outside a request, its connection is released on exit like on request teardown"""
+    with app.app_context():
+        try:
+            yield
+        finally:
+            release_connection()
+
 def execute(query, args=(), commit=False):
     """Execute SQL query and return cursor"""
     conn = get_connection()
@@ -36,3 +54,71 @@ def update(query, args=(), returns=False):
             return cur.fetchone()[0]
         else:
             return cur.rowcount
+
+def execute_named(name, args=(), commit=False):
+    """Execute a registered prepared query and return cursor"""
+    conn = get_connection()
+    try:
+        cur = prepared.execute(conn.cursor(), name, args)
+        if commit:
+            conn.commit()
+        return cur
+    except Exception as e:
+        conn.rollback()
+        current_app.logger.error(f"Database error: {e}")
+        raise
+
+def fetch_named(name, args=(), one=False):
+    """Fetch results of a registered prepared query as dictionaries"""
+    with execute_named(name, args) as cur:
+        columns = [desc[0] for desc in cur.description]
+        results = [dict(zip(columns, row)) for row in cur.fetchall()]
+        return results[0] if (one and results) else results
+
+def update_named(name, args=()):
+    """Run a registered prepared write and return the row count"""
+    with execute_named(name, args, commit=True) as cur:
+        return cur.rowcount
+
+@contextmanager
+def transaction():
+    """Run several statements on the request connection and commit once"""
+    conn = get_connection()
+    try:
+        with conn.cursor() as cur:
+            yield cur
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        current_app.logger.error(f"Database error: {e}")
+        raise
+
+def execute_many(query, args_list, commit=True):
+    """Run one statement for many argument tuples in a few round trips"""
+    conn = get_connection()
+    try:
+        with conn.cursor() as cur:
+            execute_batch(cur, query, args_list, page_size=Config.dbBatchPageSize)
+            rowcount = cur.rowcount
+        if commit:
+            conn.commit()
+        return rowcount
+    except Exception as e:
+        conn.rollback()
+        current_app.logger.error(f"Database error: {e}")
+        raise
+
+def execute_values(query, rows, commit=True):
+    """Expand rows into a single multi-row VALUES %s statement"""
+    conn = get_connection()
+    try:
+        with conn.cursor() as cur:
+            _execute_values(cur, query, rows, page_size=Config.dbBatchPageSize)
+            rowcount = cur.rowcount
+        if commit:
+            conn.commit()
+        return rowcount
+    except Exception as e:
+        conn.rollback()
+        current_app.logger.error(f"Database error: {e}")
+        raise
@@ -1,13 +1,137 @@
-from psycopg2.pool import ThreadedConnectionPool
-from config import Config 
+import os
+import time
+import threading
+import logging
+import psycopg2
+from psycopg2.pool import ThreadedConnectionPool, PoolError
+from config import Config
 
-# Initialize during app creation
-conn_pool = ThreadedConnectionPool(
+# Setup logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+class ManagedPool:
+    """ThreadedConnectionPool created lazily per process that waits instead of failing when exhausted"""
+
+    def __init__(self, minconn, maxconn, **kwargs) -> None:
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.kwargs = kwargs
+        self._lock = threading.Lock()
+        self._pool = None
+        self._pid = None
+        # Pools inherited through fork, kept referenced so their sockets are never closed from the child
+        self._orphaned = []
+        self._reset_state()
+
+    def _reset_state(self):
+        self._slots = threading.BoundedSemaphore(self.maxconn)
+        # id(conn) -> (checkout time, thread name)
+        self._checkouts = {}
+        # id(conn) -> time it was returned
+        self._returned_at = {}
+        self.waits = 0
+        self.wait_seconds_total = 0.0
+        self.timeouts = 0
+        self.reconnects = 0
+
+    def _get_pool(self):
+        if self._pool is None or self._pid != os.getpid():
+            with self._lock:
+                if self._pool is None or self._pid != os.getpid():
+                    if self._pool is not None:
+                        self._orphaned.append(self._pool)
+                    self._pool = ThreadedConnectionPool(self.minconn, self.maxconn, **self.kwargs)
+                    self._pid = os.getpid()
+                    self._reset_state()
+        return self._pool
+
+    def getconn(self):
+        """Check out a live connection, waiting up to Config.dbCheckoutTimeout for a free one"""
+        pool = self._get_pool()
+        # Only checkouts that found the pool exhausted count as waits
+        waited = None
+        if not self._slots.acquire(blocking=False):
+            start = time.perf_counter()
+            # Exhausted, anything held far too long is probably a leak
+            self.check_leaks()
+            if not self._slots.acquire(timeout=Config.dbCheckoutTimeout):
+                self.timeouts += 1
+                raise PoolError(f"connection pool exhausted after waiting {Config.dbCheckoutTimeout}s")
+            waited = time.perf_counter() - start
+
+        try:
+            conn = self._pre_ping(pool, pool.getconn())
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            if waited is not None:
+                self.waits += 1
+                self.wait_seconds_total += waited
+            self._checkouts[id(conn)] = (time.monotonic(), threading.current_thread().name)
+        return conn
+
+    def putconn(self, conn, close=False):
+        if self._pid != os.getpid():
+            # Checked out before a fork, belongs to the parent
+            return
+        with self._lock:
+            if self._checkouts.pop(id(conn), None) is None:
+                return
+            self._returned_at[id(conn)] = time.monotonic()
+        self._pool.putconn(conn, close=close or bool(conn.closed))
+        self._slots.release()
+
+    def _pre_ping(self, pool, conn):
+        """Validate a connection that sat idle, replacing it if the server dropped it"""
+        idle_since = self._returned_at.pop(id(conn), None)
+        if not conn.closed and (idle_since is None or time.monotonic() - idle_since < Config.dbPrePingAfter):
+            return conn
+        try:
+            if conn.closed:
+                raise psycopg2.InterfaceError("connection already closed")
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return conn
+        except psycopg2.Error as e:
+            logging.warning(f"Discarding stale database connection: {e}")
+            pool.putconn(conn, close=True)
+            self.reconnects += 1
+            return pool.getconn()
+
+    def check_leaks(self):
+        """Log connections checked out longer than Config.dbLeakSeconds"""
+        now = time.monotonic()
+        with self._lock:
+            leaked = [(now - since, thread) for since, thread in self._checkouts.values() if now - since > Config.dbLeakSeconds]
+        for held, thread in leaked:
+            logging.warning(f"Database connection held for {held:.0f}s by thread {thread}, possible leak")
+        return len(leaked)
+
+    def metrics(self):
+        """Gauges and counters for this process' pool"""
+        with self._lock:
+            in_use = len(self._checkouts)
+        return {
+            "in_use": in_use,
+            "idle": len(self._pool._pool) if self._pool and self._pid == os.getpid() else 0,
+            "max": self.maxconn,
+            "waits": self.waits,
+            "wait_seconds_total": self.wait_seconds_total,
+            "timeouts": self.timeouts,
+            "reconnects": self.reconnects,
+            "leaked": self.check_leaks()
+        }
+
+# Connections are opened on first use in each process, after any Celery fork
+conn_pool = ManagedPool(
     minconn=Config.dbMinConn,
     maxconn=Config.dbMaxConn,
     host=Config.dbHost,
-    database=Config.dbName, 
+    database=Config.dbName,
     user=Config.dbUser,
     password=Config.dbPass,
     port=Config.dbPort
-)
\ No newline at end of file
+)
@@ -0,0 +1,113 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import logging
+from config import Config
+from redis_pool import redis_client
+
+# Setup logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+class DownloadCache:
+    """Source videos stored once by content hash and hard-linked into each job"""
+
+    def __init__(self, directory=Config.downloadCacheDirectory) -> None:
+        self.directory = directory
+        os.makedirs(self.directory, exist_ok=True)
+
+    @staticmethod
+    def _key(source_key):
+        return f"download_cache:{source_key}"
+
+    def lookup(self, source_key, base_path):
+        """Link a cached copy to base_path + ext and return the entry, or None on a miss"""
+        try:
+            entry = redis_client.get(DownloadCache._key(source_key))
+            if entry:
+                entry = json.loads(entry)
+                object_path = self._object_path(entry["hash"], entry["ext"])
+                if os.path.exists(object_path):
+                    entry["path"] = base_path + entry["ext"]
+                    DownloadCache._link(object_path, entry["path"])
+                    # Mark as recently used
+                    os.utime(object_path)
+                    redis_client.incr("download_cache:hits")
+                    logging.info(f"Download cache hit for {source_key}")
+                    return entry
+            redis_client.incr("download_cache:misses")
+        except Exception as e:
+            logging.warning(f"Download cache lookup failed: {e}")
+        return None
+
+    def store(self, source_key, file_path, meta=None):
+        """Add a downloaded file under its content hash and return the hash"""
+        try:
+            content_hash = DownloadCache.file_hash(file_path)
+            ext = os.path.splitext(file_path)[1]
+            object_path = self._object_path(content_hash, ext)
+            if not os.path.exists(object_path):
+                DownloadCache._link(file_path, object_path)
+
+            entry = {"hash": content_hash, "ext": ext, "meta": meta or {}}
+            redis_client.set(DownloadCache._key(source_key), json.dumps(entry), ex=Config.downloadCacheTtl)
+            self.evict()
+            return content_hash
+        except Exception as e:
+            logging.warning(f"Download cache store failed: {e}")
+            return None
+
+    def evict(self):
+        """Drop expired objects, then least recently used ones until the cache fits"""
+        now = time.time()
+        entries = []
+        for entry in os.scandir(self.directory):
+            if not entry.is_file():
+                continue
+            stat = entry.stat()
+            if now - stat.st_mtime > Config.downloadCacheTtl:
+                DownloadCache._remove(entry.path)
+            else:
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= Config.downloadCacheMaxBytes:
+                break
+            DownloadCache._remove(path)
+            total -= size
+
+    @staticmethod
+    def stats():
+        hits, misses = redis_client.mget("download_cache:hits", "download_cache:misses")
+        return {"hits": int(hits or 0), "misses": int(misses or 0)}
+
+    @staticmethod
+    def file_hash(file_path):
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as file:
+            for chunk in iter(lambda: file.read(1024 ** 2), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def _object_path(self, content_hash, ext):
+        return os.path.join(self.directory, content_hash + ext)
+
+    @staticmethod
+    def _link(source, destination):
+        try:
+            os.link(source, destination)
+        except FileExistsError:
+            pass
+        except OSError:
+            # Different filesystem
+            shutil.copyfile(source, destination)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+            logging.info(f"Evicted cached download {path}")
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,150 @@
+import os
+import time
+import logging
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from config import Config
+
+# Setup logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+class DownloadError(Exception):
+    """Raised when a download can't complete or breaks a limit"""
+
+class RangeUnsupported(DownloadError):
+    """Raised when a server advertises byte ranges but answers them with the whole file"""
+
+_session = None
+_session_pid = None
+
+def get_session():
+    """Return this process' pooled keep-alive session"""
+    global _session, _session_pid
+    # Never share sockets with a forked parent
+    if _session is None or _session_pid != os.getpid():
+        retry = Retry(
+            total=Config.downloadRetries,
+            backoff_factor=0.5,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=("HEAD", "GET", "POST")
+        )
+        adapter = HTTPAdapter(pool_connections=10, pool_maxsize=Config.downloadConnections * 2, max_retries=retry)
+        _session = requests.Session()
+        _session.mount("http://", adapter)
+        _session.mount("https://", adapter)
+        _session_pid = os.getpid()
+    return _session
+
+class Downloader:
+    def __init__(self, session=None) -> None:
+        self.session = session or get_session()
+        self.max_bytes = Config.downloadMaxBytes
+        self.timeout = Config.downloadTimeout
+
+    def download(self, url, file_path, headers=None):
+        """Stream url to file_path and return the transfer stats"""
+        headers = dict(headers or {})
+        part_path = file_path + ".part"
+        start = time.perf_counter()
+
+        total, accepts_ranges = self._probe(url, headers)
+        if total and total > self.max_bytes:
+            raise DownloadError(f"{url} is {total} bytes, over the {self.max_bytes} byte cap")
+
+        try:
+            if accepts_ranges and total and total >= Config.downloadParallelMinBytes and Config.downloadConnections > 1:
+                try:
+                    size = self._fetch_parallel(url, part_path, total, headers)
+                except RangeUnsupported as e:
+                    logging.warning(f"{e}, downloading over one connection")
+                    size = self._fetch_stream(url, part_path, total, False, headers)
+            else:
+                size = self._fetch_stream(url, part_path, total, accepts_ranges, headers)
+            os.replace(part_path, file_path)
+        except BaseException:
+            # Nothing resumes a failed download later, don't leave it in reels/
+            if os.path.exists(part_path):
+                os.remove(part_path)
+            raise
+        seconds = time.perf_counter() - start
+        stats = {
+            "path": file_path,
+            "bytes": size,
+            "seconds": seconds,
+            "bytes_per_sec": size / seconds if seconds else None
+        }
+        logging.info(f"Downloaded {size} bytes in {seconds:.2f}s from {url}")
+        return stats
+
+    def _probe(self, url, headers):
+        """Return (content length, range support), both unknown if the server won't say"""
+        try:
+            res = self.session.head(url, headers=headers, allow_redirects=True, timeout=self.timeout)
+            if not res.ok:
+                return None, False
+            length = res.headers.get("Content-Length")
+            return (int(length) if length else None), res.headers.get("Accept-Ranges") == "bytes"
+        except requests.RequestException:
+            return None, False
+
+    def _fetch_stream(self, url, part_path, total, accepts_ranges, headers):
+        """Single connection download that resumes from the partial file"""
+        for attempt in range(Config.downloadRetries + 1):
+            offset = os.path.getsize(part_path) if accepts_ranges and os.path.exists(part_path) else 0
+            request_headers = {**headers, "Range": f"bytes={offset}-"} if offset else headers
+            try:
+                with self.session.get(url, headers=request_headers, stream=True, timeout=self.timeout) as res:
+                    res.raise_for_status()
+                    # Server ignored the range, start over
+                    if offset and res.status_code != 206:
+                        offset = 0
+
+                    written = offset
+                    with open(part_path, "ab" if offset else "wb") as file:
+                        for chunk in res.iter_content(Config.downloadChunkSize):
+                            written += len(chunk)
+                            if written > self.max_bytes:
+                                raise DownloadError(f"{url} exceeded the {self.max_bytes} byte cap")
+                            file.write(chunk)
+
+                if total is None or written >= total:
+                    return written
+                logging.warning(f"Download of {url} ended at {written}/{total} bytes, resuming")
+            except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+                logging.warning(f"Download attempt {attempt + 1} of {url} failed: {e}")
+
+        raise DownloadError(f"Gave up downloading {url}")
+
+    def _fetch_parallel(self, url, part_path, total, headers):
+        """Fetch byte ranges over several pooled connections into one preallocated file"""
+        with open(part_path, "wb") as file:
+            file.truncate(total)
+
+        chunk = max(total // Config.downloadConnections + 1, Config.downloadChunkSize)
+        ranges = [(begin, min(begin + chunk, total) - 1) for begin in range(0, total, chunk)]
+
+        with ThreadPoolExecutor(max_workers=Config.downloadConnections) as pool:
+            list(pool.map(lambda r: self._fetch_range(url, part_path, r[0], r[1], headers), ranges))
+        return total
+
+    def _fetch_range(self, url, part_path, begin, end, headers):
+        position = begin
+        for attempt in range(Config.downloadRetries + 1):
+            try:
+                request_headers = {**headers, "Range": f"bytes={position}-{end}"}
+                with self.session.get(url, headers=request_headers, stream=True, timeout=self.timeout) as res:
+                    if res.status_code != 206:
+                        raise RangeUnsupported(f"{url} answered a range request with {res.status_code}")
+                    with open(part_path, "r+b") as file:
+                        file.seek(position)
+                        for data in res.iter_content(Config.downloadChunkSize):
+                            file.write(data)
+                            position += len(data)
+                if position > end:
+                    return
+            except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+                logging.warning(f"Range {begin}-{end} attempt {attempt + 1} of {url} failed: {e}")
+
+        raise DownloadError(f"Gave up downloading range {begin}-{end} of {url}")
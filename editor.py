@@ -1,18 +1,35 @@
 import os
 from config import Config
 from moviepy import *
-import shutil
+from moviepy.config import FFMPEG_BINARY
+import subprocess
+import time
+import itertools
 import logging
+import numpy as np
+from encoding import get_profile, ffmpeg_video_args, ffmpeg_audio_args
+import media_probe
+import rusage
+import tempfile
+from gameplay_source import GameplaySource
+from compositor import FrameReader, SplitCompositor
 
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 class Editor:
-    def __init__(self, video_path, gameplay_path, config) -> None:
+    def __init__(self, video_path, gameplay_path, config, gameplay_start=0.0, media=None, gameplay_media=None) -> None:
         try:
-            self.main_video = VideoFileClip(video_path)
-            self.gameplay_video = VideoFileClip(gameplay_path).without_audio()
-        except OSError as e:
+            self.video_path = video_path
+            self.media = media or media_probe.probe(video_path, keyframes=False)
+            self.original_size = (self.media["width"], self.media["height"])
+            # Large sources are scaled by ffmpeg while decoding, everything after works on the smaller frames
+            self.decode_size = Editor.source_size(config, *self.original_size)
+            # Only opened for the clips_array compositor, the numpy one decodes through FrameReader
+            self.main_video = None
+            # Decoded on demand from gameplay_start for exactly the main video's length
+            self.gameplay_source = GameplaySource(gameplay_path, gameplay_start, media=gameplay_media)
+        except (OSError, subprocess.CalledProcessError) as e:
             logging.error(f"Failed to load video files: {e}")
             raise
         
@@ -20,9 +37,17 @@ class Editor:
         self.clips = []
         
         try:       
-            self.width, self.height = self.main_video.size
+            self.width, self.height = self.decode_size
+            self.duration = self.media["duration"]
+            self.fps = self.media["fps"]
             # Compute percentage
             self.percentage = self.config["original_video_percentage"] / 100.0
+            self.profile_name, self.profile = get_profile(self.config.get("encoding_profile"))
+            self.encode_seconds = None
+            self.composite_seconds = None
+            self.frames = None
+            # Called with the rendered fraction while encoding
+            self.on_progress = None
         except KeyError as e:
             logging.error(f"Missing config key: {e}")
             raise
@@ -31,42 +56,21 @@ class Editor:
             raise
         
     def start_editing(self, video_id):
-        # Set final duration to match the original video.
         try:            
-            duration = self.main_video.duration
-            if self.gameplay_video.duration > duration:
-                self.gameplay_video = self.gameplay_video.subclipped(0, duration)
-            else:
-                self.gameplay_video = self.gameplay_video.with_effects([vfx.Loop(duration=duration)])
-                
-            if self.config["split_type"] == "vertical":
-                if self.config["edit_type"] == "fit":
-                    self._vertical_fit()
-                elif self.config["edit_type"] == "crop":
-                    self._vertical_crop()
-                else:
-                    logging.error("Invalid split_type in config")
-                    raise ValueError("Invalid split_type")
-                
-            elif self.config["split_type"] == "horizontal":
-                self._horizontal()
-            else:
-                logging.error("Invalid split_type in config")
-                raise ValueError("Invalid split_type")
+            duration = self.duration
             
-            final_clip = clips_array(
-                self.clips
-            )
+            if Config.moviepyCompositor == "numpy":
+                final_clip = self._composited_clip(duration)
+            else:
+                final_clip = self._clips_array_clip()
             
             output_path = os.path.join(Config.outputDirectory, video_id + ".mp4")
 
-            final_clip.write_videofile(
-                output_path,
-                fps=60,
-                bitrate="15M",
-                preset="slow", # Slower encoding for higher quality
-                temp_audiofile_path="tmp_audio"
-            )    
+            self.frames = int(duration * self.fps)
+            start = time.perf_counter()
+            self._encode(final_clip, output_path, duration)
+            # Frames are composited inside the encode loop, that time is already in composite_seconds
+            self.encode_seconds = time.perf_counter() - start - self.composite_seconds
             return output_path
         
         except Exception as e:
@@ -79,13 +83,110 @@ class Editor:
     def _cleanup(self):
         """Release resources"""
         try:
-            if hasattr(self, 'main_video'):
+            if getattr(self, 'main_video', None):
                 self.main_video.close()
-            if hasattr(self, 'gameplay_video'):
-                self.gameplay_video.close()
+            if hasattr(self, 'compositor'):
+                self.compositor.close()
+            if hasattr(self, 'gameplay_source'):
+                self.gameplay_source.close()
         except Exception as e:
             logging.warning(f"Error during cleanup: {e}")
               
+    def _encode(self, clip, output_path, duration):
+        """Pipe raw frames into ffmpeg on stdin and map the source audio in without a temp file"""
+        fps = self.fps
+        width, height = clip.size
+        audio_codec = self.media.get("audio_codec")
+        command = [
+            FFMPEG_BINARY, "-y", "-loglevel", "error",
+            "-f", "rawvideo", "-pix_fmt", "rgb24", "-s", f"{width}x{height}", "-r", f"{fps:g}", "-i", "-",
+            "-i", self.video_path,
+            "-map", "0:v", "-map", "1:a?",
+            *ffmpeg_audio_args(audio_codec),
+            "-t", f"{duration:.3f}",
+            *ffmpeg_video_args(self.profile, fps),
+            "-pix_fmt", "yuv420p",
+            "-movflags", "+faststart",
+            output_path
+        ]
+
+        with tempfile.TemporaryFile() as stderr:
+            process = subprocess.Popen(command, stdin=subprocess.PIPE, stderr=stderr)
+            # Frames are composed lazily, so compositing is the time spent waiting on the next one
+            self.composite_seconds = 0.0
+            frames = clip.iter_frames(fps=fps, dtype="uint8")
+            try:
+                for index in itertools.count():
+                    composite_start = time.perf_counter()
+                    frame = next(frames, None)
+                    self.composite_seconds += time.perf_counter() - composite_start
+                    if frame is None:
+                        break
+                    # The compositor's buffer goes out as is, other clips are made contiguous once
+                    process.stdin.write(memoryview(np.ascontiguousarray(frame)))
+                    if self.on_progress and self.frames:
+                        self.on_progress((index + 1) / self.frames)
+            except BrokenPipeError:
+                # ffmpeg exited, its error is on stderr
+                pass
+            except BaseException:
+                # A failed frame or a time limit, ffmpeg would otherwise wait on stdin forever
+                process.kill()
+                raise
+            finally:
+                try:
+                    process.stdin.close()
+                except BrokenPipeError:
+                    pass
+                returncode = rusage.wait(process)
+            if returncode:
+                stderr.seek(0)
+                raise subprocess.CalledProcessError(returncode, command, stderr=stderr.read())
+
+    def _composited_clip(self, duration):
+        """Composite into one preallocated frame, ffmpeg crops and scales each input straight into its pane"""
+        layout = Editor.layout(self.config, self.width, self.height)
+        fps = self.fps
+
+        x1, y1, x2, y2 = layout["main_box"]
+        main_filters = [] if self.decode_size == self.original_size else [f"scale={self.width}:{self.height}"]
+        if (x1, y1, x2, y2) != (0, 0, self.width, self.height):
+            main_filters.append(f"crop={x2 - x1}:{y2 - y1}:{x1}:{y1}")
+        main_reader = FrameReader(self.video_path, (x2 - x1, y2 - y1), fps, main_filters, duration=duration)
+
+        target_width, target_height = layout["gameplay_size"]
+        gameplay_filters = Editor.gameplay_filters(*self.gameplay_source.size, target_width, target_height)
+        gameplay_reader = self.gameplay_source.reader(fps, (target_width, target_height), gameplay_filters)
+
+        self.compositor = SplitCompositor(layout, main_reader, gameplay_reader)
+        return VideoClip(frame_function=self.compositor.frame, duration=duration).with_fps(fps)
+
+    def _clips_array_clip(self):
+        """Composite with MoviePy's clips_array, a new canvas and cropped copies every frame"""
+        # Audio is muxed from the source file by the encoder, MoviePy only reads frames
+        self.main_video = VideoFileClip(
+            self.video_path,
+            audio=False,
+            target_resolution=self.decode_size if self.decode_size != self.original_size else None
+        )
+        self.gameplay_video = self.gameplay_source.clip(self.duration, self.fps)
+        if self.config["split_type"] == "vertical":
+            if self.config["edit_type"] == "fit":
+                self._vertical_fit()
+            elif self.config["edit_type"] == "crop":
+                self._vertical_crop()
+            else:
+                logging.error("Invalid split_type in config")
+                raise ValueError("Invalid split_type")
+            
+        elif self.config["split_type"] == "horizontal":
+            self._horizontal()
+        else:
+            logging.error("Invalid split_type in config")
+            raise ValueError("Invalid split_type")
+        
+        return clips_array(self.clips)
+
     def _horizontal(self):
         # Compute target height
         try:      
@@ -149,26 +250,132 @@ class Editor:
             raise
         
     @staticmethod
-    def center_weighted_crop(clip, target_width, target_height):
-        try:
-            original_width, original_height = clip.size
+    def layout(config, width, height):
+        """Compute the split-screen geometry for a main video of width x height"""
+        percentage = config["original_video_percentage"] / 100.0
+        if config["split_type"] == "vertical":
+            if config["edit_type"] == "fit":
+                main_box = (0, 0, width, height)
+                gameplay_size = (width, height)
+            elif config["edit_type"] == "crop":
+                main_width = int(percentage * width)
+                main_box = Editor.center_weighted_box(width, height, main_width, height)
+                gameplay_size = (width - main_width, height)
+            else:
+                logging.error("Invalid split_type in config")
+                raise ValueError("Invalid split_type")
+            main_first = config["video_position"] == "left"
+        elif config["split_type"] == "horizontal":
+            main_height = int(percentage * height)
+            main_box = Editor.rule_of_thirds_box(width, height, main_height)
+            gameplay_size = (width, height - main_height)
+            main_first = config["video_position"] == "top"
+        else:
+            logging.error("Invalid split_type in config")
+            raise ValueError("Invalid split_type")
 
-            if target_height < original_height:
-                pixels_to_remove = original_height - target_height
+        return {
+            "main_box": main_box,
+            "gameplay_size": gameplay_size,
+            "stack": "vstack" if config["split_type"] == "horizontal" else "hstack",
+            "main_first": main_first
+        }
 
-                top = pixels_to_remove // 2
-                bottom = top + target_height
+    @staticmethod
+    def source_size(config, width, height):
+        """Size to decode the main video at so the composed output fits the config's maximum resolution"""
+        limit = Config.outputResolutions.get(config.get("max_resolution") or Config.defaultOutputResolution)
+        if not limit:
+            return width, height
 
-                clip = clip.cropped(y1=top, y2=bottom)
+        layout = Editor.layout(config, width, height)
+        x1, y1, x2, y2 = layout["main_box"]
+        gameplay_width, gameplay_height = layout["gameplay_size"]
+        if layout["stack"] == "vstack":
+            output_size = (x2 - x1, (y2 - y1) + gameplay_height)
+        else:
+            output_size = ((x2 - x1) + gameplay_width, y2 - y1)
 
-            if target_width < original_width:
-                pixels_to_remove = original_width - target_width
-                left = pixels_to_remove // 2
-                right = left + target_width
+        scale = min(1.0, min(limit) / min(output_size), max(limit) / max(output_size))
+        if scale == 1.0:
+            return width, height
+        # Even sizes keep 4:2:0 chroma aligned
+        return max(2, int(width * scale) // 2 * 2), max(2, int(height * scale) // 2 * 2)
 
-                clip = clip.cropped(x1=left, x2=right)
+    @staticmethod
+    def center_weighted_box(original_width, original_height, target_width, target_height):
+        """Return the (x1, y1, x2, y2) box of a centred crop"""
+        x1, y1, x2, y2 = 0, 0, original_width, original_height
 
-            return clip
+        if target_height < original_height:
+            pixels_to_remove = original_height - target_height
+            y1 = pixels_to_remove // 2
+            y2 = y1 + target_height
+
+        if target_width < original_width:
+            pixels_to_remove = original_width - target_width
+            x1 = pixels_to_remove // 2
+            x2 = x1 + target_width
+
+        return x1, y1, x2, y2
+
+    @staticmethod
+    def rule_of_thirds_box(original_width, original_height, target_height):
+        """Return the (x1, y1, x2, y2) box of a rule of thirds crop"""
+        # Calculate the three horizontal zones (top/middle/bottom)
+        zone_height = original_height // 3
+        bottom_zone = zone_height
+
+        # How much we need to remove
+        pixels_to_remove = original_height - target_height
+
+        # Case 1: No cropping needed
+        if pixels_to_remove <= 0:
+            return 0, 0, original_width, original_height
+
+        # Case 2: Can remove entirely from bottom
+        if pixels_to_remove <= bottom_zone:
+            return 0, 0, original_width, original_height - pixels_to_remove
+
+        # Case 3: Need to remove from bottom + distribute remainder
+        # First remove entire bottom zone
+        bottom_crop = bottom_zone
+        remaining_crop = pixels_to_remove - bottom_crop
+
+        # Split remaining between top and middle
+        top_crop = int(remaining_crop * 0.3) # Remove 30% from the top and the remaining from middle
+        middle_crop = remaining_crop - top_crop
+
+        return 0, top_crop, original_width, original_height - middle_crop - bottom_crop
+
+    @staticmethod
+    def smart_resize_size(original_width, original_height, target_width, target_height):
+        """Return the size a clip is scaled to so it covers the target"""
+        if original_width < target_width or original_height < target_height:
+            # Scale up to cover at least one dimension
+            scale_factor = max(target_width / original_width, target_height / original_height)
+            return (
+                max(target_width, round(original_width * scale_factor)),
+                max(target_height, round(original_height * scale_factor))
+            )
+        return original_width, original_height
+
+    @staticmethod
+    def gameplay_filters(width, height, target_width, target_height):
+        """ffmpeg filters scaling gameplay to cover the pane, then centre cropping it"""
+        scaled_width, scaled_height = Editor.smart_resize_size(width, height, target_width, target_height)
+        x1, y1, x2, y2 = Editor.center_weighted_box(scaled_width, scaled_height, target_width, target_height)
+        return [f"scale={scaled_width}:{scaled_height}", f"crop={x2 - x1}:{y2 - y1}:{x1}:{y1}", "setsar=1"]
+
+    @staticmethod
+    def center_weighted_crop(clip, target_width, target_height):
+        try:
+            original_width, original_height = clip.size
+            x1, y1, x2, y2 = Editor.center_weighted_box(original_width, original_height, target_width, target_height)
+
+            if (x1, y1, x2, y2) == (0, 0, original_width, original_height):
+                return clip
+            return clip.cropped(x1=x1, y1=y1, x2=x2, y2=y2)
         except Exception as e:
             logging.error(f"Error in center_weighted_crop: {e}")
             raise
@@ -177,40 +384,11 @@ class Editor:
     def rule_of_thirds_crop(clip, target_height):
         try:            
             original_width, original_height = clip.size
+            x1, y1, x2, y2 = Editor.rule_of_thirds_box(original_width, original_height, target_height)
 
-            # Calculate the three horizontal zones (top/middle/bottom)
-            zone_height = original_height // 3
-
-            top_zone = zone_height
-            middle_zone = zone_height * 2
-            bottom_zone = zone_height
-
-            # How much we need to remove
-            pixels_to_remove = original_height - target_height
-
-            # Case 1: No cropping needed
-            if pixels_to_remove <= 0:
+            if (y1, y2) == (0, original_height):
                 return clip
-
-            # Case 2: Can remove entirely from bottom
-            if pixels_to_remove <= bottom_zone:
-                return clip.cropped(y2=original_height - pixels_to_remove)
-
-            # Case 3: Need to remove from bottom + distribute remainder
-            else:
-                # First remove entire bottom zone
-                bottom_crop = bottom_zone
-                remaining_crop = pixels_to_remove - bottom_crop
-
-                # Split remaining between top and middle
-                top_crop = int(remaining_crop * 0.3) # Remove 30% from the top and the remaining from middle
-                middle_crop = remaining_crop - top_crop 
-
-                # Apply cropping
-                return clip.cropped(
-                    y1=top_crop,
-                    y2=(original_height - middle_crop -  bottom_crop)
-                )
+            return clip.cropped(y1=y1, y2=y2)
         except Exception as e:
             logging.error(f"Error in rule_of_thirds_crop: {e}")
             raise
@@ -218,19 +396,68 @@ class Editor:
     @staticmethod
     def smart_resize(clip, target_width, target_height):
         try:           
-            if clip.size[0] < target_width or clip.size[1] < target_height:
-                # Scale up to cover at least one dimension
-                scale_factor = max(target_width/clip.w, target_height/clip.h)
-                return clip.resized(scale_factor)
+            new_size = Editor.smart_resize_size(clip.w, clip.h, target_width, target_height)
+            if new_size != tuple(clip.size):
+                return clip.resized(new_size)
             return clip
         except Exception as e:
             logging.error(f"Error in smart_resize: {e}")
             raise
         
     @staticmethod
-    def copycat(video_path):
+    def copycat(video_path, video_id):
+        """Publish the source as outputs/<video_id>.mp4 without rendering"""
+        output_path = os.path.join(Config.outputDirectory, video_id + ".mp4")
         try:
-            return shutil.copy(video_path, Config.outputDirectory)
+            if os.path.exists(output_path):
+                os.remove(output_path)
+
+            # Linked as is only when the player can start before the whole file arrived
+            if os.path.splitext(video_path)[1].lower() == ".mp4" and Editor.is_faststart(video_path):
+                try:
+                    # Same filesystem, no bytes are copied at all
+                    os.link(video_path, output_path)
+                except OSError:
+                    # Reflink where the filesystem supports it, plain copy otherwise
+                    subprocess.run(["cp", "--reflink=auto", video_path, output_path], check=True, capture_output=True)
+            else:
+                # Different container or index at the end, remux without touching the streams
+                subprocess.run([
+                    FFMPEG_BINARY, "-y", "-loglevel", "error",
+                    "-i", video_path,
+                    "-map", "0:v", "-map", "0:a?",
+                    "-c", "copy",
+                    "-movflags", "+faststart",
+                    output_path
+                ], check=True, capture_output=True)
+            return output_path
+        except subprocess.CalledProcessError as e:
+            logging.error(f"Error remuxing video file: {e.stderr.decode(errors='replace')}")
+            raise
         except Exception as e:
             logging.error(f"Error copying video file: {e}")
             raise
+
+    @staticmethod
+    def is_faststart(path):
+        """True when the MP4 index (moov) comes before the media data (mdat)"""
+        with open(path, "rb") as file:
+            while True:
+                header = file.read(8)
+                if len(header) < 8:
+                    return False
+                size = int.from_bytes(header[:4], "big")
+                box = header[4:]
+                if box == b"moov":
+                    return True
+                if box == b"mdat":
+                    return False
+                if size == 1:
+                    # 64 bit size follows the type
+                    size = int.from_bytes(file.read(8), "big")
+                    file.seek(size - 16, os.SEEK_CUR)
+                elif size < 8:
+                    # Runs to the end of the file, or isn't a valid box
+                    return False
+                else:
+                    file.seek(size - 8, os.SEEK_CUR)
@@ -0,0 +1,34 @@
+from config import Config
+
+def get_profile(name):
+    """Return the (name, settings) of an encoding profile, falling back to the default"""
+    if name not in Config.encodingProfiles:
+        name = Config.defaultEncodingProfile
+    return name, Config.encodingProfiles[name]
+
+def ffmpeg_video_args(profile, fps, threads=None):
+    """Translate an encoding profile into ffmpeg output arguments, threads overrides the profile's"""
+    args = ["-r", f"{fps:g}", "-c:v", profile["codec"], "-preset", profile["preset"]]
+    if profile.get("crf") is not None:
+        args += ["-crf", str(profile["crf"])]
+    else:
+        args += ["-b:v", profile["bitrate"]]
+    args += ["-threads", str(profile["threads"] if threads is None else threads)]
+    return args
+
+def ffmpeg_audio_args(audio_codec):
+    """Copy the source audio into the MP4 untouched when the container allows it, AAC otherwise"""
+    if audio_codec in Config.mp4AudioCodecs:
+        return ["-c:a", "copy"]
+    return ["-c:a", "aac"]
+
+def ffmpeg_loop_input(path, offset, index):
+    """Inputs playing path from offset then from the file start forever, and the filter source reading them
+
+    -stream_loop after an input seek restarts every loop at the seek point, so the tail from offset is its
+    own input, joined to the whole file looped from zero. The source ends in a comma when it's a filter.
+    """
+    if not offset:
+        return ["-stream_loop", "-1", "-i", path], f"[{index}:v]"
+    inputs = ["-ss", f"{offset:.3f}", "-i", path, "-stream_loop", "-1", "-i", path]
+    return inputs, f"[{index}:v][{index + 1}:v]concat=n=2:v=1:a=0,"
@@ -0,0 +1,135 @@
+import os
+import subprocess
+import tempfile
+import time
+import logging
+from config import Config
+from editor import Editor
+from encoding import get_profile, ffmpeg_video_args, ffmpeg_audio_args, ffmpeg_loop_input
+from moviepy.config import FFMPEG_BINARY
+import media_probe
+import rusage
+
+# Setup logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+class FFmpegEditor:
+    """Render the split screen with a single ffmpeg filter graph instead of MoviePy"""
+
+    def __init__(self, video_path, gameplay_path, config, gameplay_start=0.0, media=None, gameplay_media=None) -> None:
+        self.video_path = video_path
+        self.gameplay_path = gameplay_path
+        self.config = config
+        # Offset into the gameplay the output starts at
+        self.gameplay_start = gameplay_start
+
+        try:
+            # Metadata probed earlier in the pipeline, otherwise read now
+            self.media = media or media_probe.probe(video_path)
+            gameplay_media = gameplay_media or media_probe.probe(gameplay_path, keyframes=False)
+        except (OSError, subprocess.CalledProcessError) as e:
+            logging.error(f"Failed to load video files: {e}")
+            raise
+
+        try:
+            self.original_size = (self.media["width"], self.media["height"])
+            # Working size of the main video, scaled down first thing in the graph when over the config's limit
+            self.width, self.height = Editor.source_size(self.config, *self.original_size)
+            self.gameplay_width, self.gameplay_height = gameplay_media["width"], gameplay_media["height"]
+            self.gameplay_duration = gameplay_media["duration"]
+            self.duration = self.media["duration"]
+            self.fps = self.media["fps"]
+            self.has_audio = self.media["has_audio"]
+            # Validate the percentage like Editor does
+            self.percentage = self.config["original_video_percentage"] / 100.0
+            self.profile_name, self.profile = get_profile(self.config.get("encoding_profile"))
+            self.encode_seconds = None
+            # Compositing happens inside the encode
+            self.composite_seconds = None
+            self.frames = int(self.duration * self.fps)
+            # Called with the rendered fraction while encoding
+            self.on_progress = None
+        except KeyError as e:
+            logging.error(f"Missing config key: {e}")
+            raise
+        except Exception as e:
+            logging.error(f"Error during initialization: {e}")
+            raise
+
+    def start_editing(self, video_id):
+        try:
+            output_path = os.path.join(Config.outputDirectory, video_id + ".mp4")
+            command = self.build_command(output_path)
+
+            start = time.perf_counter()
+            self.run_with_progress(command, self.duration)
+            self.encode_seconds = time.perf_counter() - start
+            return output_path
+
+        except subprocess.CalledProcessError as e:
+            logging.error(f"ffmpeg failed: {e.stderr.decode(errors='replace')}")
+            raise
+        except Exception as e:
+            logging.exception(f"Error during video editing: {e}")
+            raise
+
+    def run_with_progress(self, command, duration):
+        """Run an ffmpeg command, reporting its position through on_progress"""
+        if not self.on_progress:
+            rusage.run(command)
+            return
+
+        # Key=value progress blocks on stdout, errors stay on stderr
+        command = [command[0], "-progress", "pipe:1", "-nostats", *command[1:]]
+        with tempfile.TemporaryFile() as stderr:
+            process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=stderr, text=True)
+            for line in process.stdout:
+                key, _, value = line.strip().partition("=")
+                if key == "out_time_us" and value.isdigit() and duration:
+                    self.on_progress(int(value) / 1e6 / duration)
+            returncode = rusage.wait(process)
+            if returncode:
+                stderr.seek(0)
+                raise subprocess.CalledProcessError(returncode, command, stderr=stderr.read())
+
+    def build_command(self, output_path, start=0, duration=None, audio=True, threads=None):
+        """Compile the config into one ffmpeg invocation, optionally for a slice of the timeline"""
+        if duration is None:
+            duration = self.duration - start
+        # Gameplay loops, so a slice starting later picks it up where a full render would be
+        gameplay_offset = (self.gameplay_start + start) % self.gameplay_duration if self.gameplay_duration else 0
+        gameplay_inputs, gameplay_source = ffmpeg_loop_input(self.gameplay_path, gameplay_offset, 1)
+
+        return [
+            FFMPEG_BINARY, "-y", "-loglevel", "error",
+            *(["-ss", f"{start:.3f}"] if start else []),
+            "-i", self.video_path,
+            *gameplay_inputs,
+            "-filter_complex", self.filter_graph(gameplay_source),
+            "-map", "[out]",
+            *(["-map", "0:a", *ffmpeg_audio_args(self.media.get("audio_codec"))] if audio and self.has_audio else ["-an"]),
+            "-t", f"{duration:.3f}",
+            *ffmpeg_video_args(self.profile, self.fps, threads),
+            "-pix_fmt", "yuv420p",
+            "-movflags", "+faststart",
+            output_path
+        ]
+
+    def filter_graph(self, gameplay_source="[1:v]"):
+        """Build the crop/scale/stack filter graph from Editor's geometry"""
+        layout = Editor.layout(self.config, self.width, self.height)
+
+        # Main video is scaled down right after decoding when needed, then cropped
+        x1, y1, x2, y2 = layout["main_box"]
+        main_scale = "" if (self.width, self.height) == self.original_size else f"scale={self.width}:{self.height},"
+        main_filter = f"[0:v]{main_scale}crop={x2 - x1}:{y2 - y1}:{x1}:{y1},setsar=1[main]"
+
+        # Gameplay is scaled to cover the pane, then centre cropped
+        target_width, target_height = layout["gameplay_size"]
+        gameplay_filters = Editor.gameplay_filters(self.gameplay_width, self.gameplay_height, target_width, target_height)
+        gameplay_filter = f"{gameplay_source}{','.join(gameplay_filters)}[game]"
+
+        inputs = "[main][game]" if layout["main_first"] else "[game][main]"
+        stack_filter = f"{inputs}{layout['stack']}=inputs=2[out]"
+
+        return ";".join([main_filter, gameplay_filter, stack_filter])
@@ -0,0 +1,51 @@
+import random
+import logging
+import numpy as np
+from moviepy import VideoClip
+from compositor import FrameReader
+import media_probe
+
+# Setup logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+def pick_start(keyframes, gameplay_duration, needed=None):
+    """Random keyframe to start the gameplay at, preferring ones that play through without wrapping"""
+    if not keyframes:
+        return 0.0
+    if needed:
+        unwrapped = [keyframe for keyframe in keyframes if keyframe + needed <= gameplay_duration]
+        if unwrapped:
+            return random.choice(unwrapped)
+    return random.choice(keyframes)
+
+class GameplaySource:
+    """Gameplay footage played from start, looping back to the beginning of the file at its end"""
+
+    def __init__(self, path, start=0.0, media=None) -> None:
+        self.path = path
+        media = media or media_probe.probe(path, keyframes=False)
+        self.size = (media["width"], media["height"])
+        self.duration = media["duration"]
+        self.start = start % self.duration if self.duration else 0.0
+        self.readers = []
+
+    def reader(self, fps, size=None, filters=()):
+        """Frame reader over the looping footage, size is the frame size after filters"""
+        reader = FrameReader(self.path, size or self.size, fps, filters, start=self.start, duration=self.duration, loop=True)
+        self.readers.append(reader)
+        return reader
+
+    def clip(self, duration, fps):
+        """A MoviePy clip of the given length whose frames are decoded on demand"""
+        reader = self.reader(fps)
+        buffer = np.empty((self.size[1], self.size[0], 3), dtype=np.uint8)
+
+        def frame(t):
+            reader.read_to(int(t * fps + 1e-6), buffer)
+            return buffer
+
+        return VideoClip(frame_function=frame, duration=duration).with_fps(fps)
+
+    def close(self):
+        for reader in self.readers:
+            reader.close()
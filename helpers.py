@@ -3,6 +3,8 @@ from functools import wraps
 import re
 import hashlib
 import hmac
+import json
+import base64
 from config import Config
 
 def verify_signature(f):
@@ -89,4 +91,24 @@ def is_video_link(text):
     mo = pattern.search(text)
     if mo is None:
         return None
-    return mo.group()
\ No newline at end of file
+    return mo.group()
+
+def encode_cursor(*values):
+    """Opaque keyset pagination cursor for the sort key of the last row of a page"""
+    return base64.urlsafe_b64encode(json.dumps(values, default=str).encode()).decode()
+
+def decode_cursor(cursor, default):
+    """Sort key values of a cursor, default for the first page, ValueError for a malformed cursor"""
+    if not cursor:
+        return default
+    values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    if not isinstance(values, list) or len(values) != len(default):
+        raise ValueError("Malformed cursor")
+    if not all(isinstance(value, type(fallback)) for value, fallback in zip(values, default)):
+        raise ValueError("Malformed cursor")
+    return tuple(values)
+
+def sign_media_path(path, expires):
+    """Token for path valid until expires, matches nginx secure_link_md5 "$secure_link_expires$uri <key>" """
+    digest = hashlib.md5(f"{expires}{path} {Config.mediaSigningKey}".encode()).digest()
+    return base64.urlsafe_b64encode(digest).decode().rstrip("=")
@@ -0,0 +1,57 @@
+import json
+import time
+import logging
+from config import Config
+from redis_pool import redis_client
+
+# Setup logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+def channel(user_id):
+    return f"job_events:{user_id}"
+
+def publish(user_id, job_id, **fields):
+    """Announce a job change to the user's open progress pages, best effort"""
+    try:
+        redis_client.publish(channel(user_id), json.dumps({"id": job_id, **fields}, default=str))
+    except Exception as e:
+        logging.warning(f"Failed to publish job event: {e}")
+
+class ProgressReporter:
+    """Encoder progress callback taking the rendered fraction of the timeline"""
+
+    def __init__(self, user_id, job_id) -> None:
+        self.user_id = user_id
+        self.job_id = job_id
+        self.last = 0.0
+
+    def __call__(self, fraction):
+        fraction = min(max(fraction, 0.0), 1.0)
+        # Encoders report every frame, only meaningful steps reach redis
+        if fraction - self.last < Config.progressMinStep and fraction < 1.0:
+            return
+        self.last = fraction
+        publish(self.user_id, self.job_id, status="processing", progress=round(fraction * 100))
+
+def stream(user_id):
+    """Server-Sent Events for the user's jobs, one event per published change, for at most sseMaxSeconds"""
+    pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe(channel(user_id))
+    try:
+        # Tell the browser how soon to reconnect if the stream drops
+        yield "retry: 3000\n\n"
+        last_sent = time.monotonic()
+        # The browser reconnects after the retry delay, so a forgotten tab doesn't hold a worker forever
+        deadline = last_sent + Config.sseMaxSeconds
+        while time.monotonic() < deadline:
+            message = pubsub.get_message(timeout=max(0.0, min(Config.sseKeepaliveSeconds, deadline - time.monotonic())))
+            if message and message["type"] == "message":
+                data = message["data"]
+                yield f"data: {data.decode() if isinstance(data, bytes) else data}\n\n"
+                last_sent = time.monotonic()
+            elif time.monotonic() - last_sent >= Config.sseKeepaliveSeconds:
+                # Comment line, keeps proxies from closing an idle stream
+                yield ": keepalive\n\n"
+                last_sent = time.monotonic()
+    finally:
+        pubsub.close()
@@ -0,0 +1,188 @@
+import re
+import json
+import shutil
+import datetime
+import functools
+import subprocess
+import logging
+from config import Config
+from moviepy.config import FFMPEG_BINARY
+from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
+
+# Setup logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Metadata stored for gameplays and downloaded sources, sizes are after rotation
+MEDIA_COLUMNS = ("width", "height", "fps", "codec", "rotation", "has_audio", "audio_codec", "duration", "keyframes")
+
+class MediaError(Exception):
+    """The file can't be used as a render input"""
+
+def probe(path, keyframes=True):
+    """Read stream metadata with ffprobe, nothing is decoded"""
+    if not has_ffprobe():
+        return _probe_with_ffmpeg(path, keyframes)
+    result = subprocess.run([
+        Config.ffprobeBinary, "-v", "error",
+        "-show_streams", "-show_format",
+        "-of", "json",
+        path
+    ], check=True, capture_output=True, text=True)
+    data = json.loads(result.stdout)
+
+    streams = data.get("streams", [])
+    video = next((stream for stream in streams if stream.get("codec_type") == "video"), None)
+    audio = next((stream for stream in streams if stream.get("codec_type") == "audio"), None)
+    if video is None:
+        raise MediaError("No video stream")
+
+    rotation = _rotation(video)
+    width, height = int(video["width"]), int(video["height"])
+    if rotation in (90, 270):
+        width, height = height, width
+
+    return {
+        "width": width,
+        "height": height,
+        "fps": _rate(video.get("avg_frame_rate")) or _rate(video.get("r_frame_rate")),
+        "codec": video.get("codec_name"),
+        "rotation": rotation,
+        "has_audio": audio is not None,
+        "audio_codec": audio.get("codec_name") if audio else None,
+        "duration": float(data.get("format", {}).get("duration") or video.get("duration") or 0),
+        "keyframes": probe_keyframes(path) if keyframes else None
+    }
+
+def probe_keyframes(path):
+    """Keyframe timestamps of a video, read from packet flags without decoding"""
+    if not has_ffprobe():
+        return _keyframes_with_ffmpeg(path)
+    result = subprocess.run([
+        Config.ffprobeBinary, "-v", "error",
+        "-select_streams", "v:0",
+        "-show_entries", "packet=pts_time,flags",
+        "-of", "csv=p=0",
+        path
+    ], check=True, capture_output=True, text=True)
+
+    keyframes = []
+    for line in result.stdout.splitlines():
+        pts_time, _, flags = line.partition(",")
+        if "K" in flags and pts_time not in ("", "N/A"):
+            keyframes.append(float(pts_time))
+    return sorted(keyframes)
+
+@functools.cache
+def has_ffprobe():
+    """imageio-ffmpeg only bundles ffmpeg, ffprobe has to come from the system"""
+    if shutil.which(Config.ffprobeBinary):
+        return True
+    logging.warning(f"{Config.ffprobeBinary} not found, probing through the bundled ffmpeg")
+    return False
+
+def _probe_with_ffmpeg(path, keyframes):
+    """probe() from ffmpeg's input banner, it names no audio codec so the audio is always re-encoded"""
+    try:
+        infos = ffmpeg_parse_infos(path)
+    except OSError as e:
+        raise MediaError("Unreadable file") from e
+    if not infos.get("video_found"):
+        raise MediaError("No video stream")
+
+    rotation = int(infos.get("video_rotation") or 0) % 360
+    width, height = infos["video_size"]
+    if rotation in (90, 270):
+        width, height = height, width
+
+    return {
+        "width": width,
+        "height": height,
+        "fps": infos.get("video_fps"),
+        "codec": infos.get("video_codec_name"),
+        "rotation": rotation,
+        "has_audio": bool(infos.get("audio_found")),
+        "audio_codec": None,
+        "duration": float(infos.get("duration") or 0),
+        "keyframes": _keyframes_with_ffmpeg(path) if keyframes else None
+    }
+
+def _keyframes_with_ffmpeg(path):
+    """probe_keyframes() by decoding only the keyframes and reading their timestamps from showinfo"""
+    result = subprocess.run([
+        FFMPEG_BINARY, "-hide_banner", "-nostats",
+        "-skip_frame", "nokey", "-i", path,
+        "-map", "0:v:0", "-vf", "showinfo", "-f", "null", "-"
+    ], check=True, capture_output=True, text=True)
+    return sorted(float(match) for match in re.findall(r"pts_time:\s*([-\d.]+)", result.stderr))
+
+def validate(media):
+    """Raise MediaError for sources no render should be attempted on"""
+    if not media.get("duration") or media["duration"] <= 0:
+        raise MediaError("Video has no duration")
+    if media["duration"] > Config.sourceMaxSeconds:
+        raise MediaError(f"Video is longer than {Config.sourceMaxSeconds // 60} minutes")
+    if not media.get("fps"):
+        raise MediaError("Video has no frame rate")
+    if min(media["width"], media["height"]) < Config.sourceMinDimension:
+        raise MediaError(f"Video is smaller than {Config.sourceMinDimension}px")
+
+def gameplay_metadata(db, gameplay_id, path):
+    """Metadata of a gameplay file, probed on first use and kept on its gameplays row"""
+    row = db.fetch(f"SELECT {', '.join(MEDIA_COLUMNS)} FROM gameplays WHERE id = %s;", args=(gameplay_id,), one=True)
+    if row and row.get("duration") is not None and row.get("keyframes") is not None:
+        return row
+
+    media = probe(path)
+    assignments = ", ".join(f"{column} = %s" for column in MEDIA_COLUMNS)
+    db.update(f"UPDATE gameplays SET {assignments} WHERE id = %s;", args=(*(media[column] for column in MEDIA_COLUMNS), gameplay_id))
+    return media
+
+def source_metadata(db, content_hash, path):
+    """Metadata of a downloaded source, shared by every job with the same content"""
+    if content_hash:
+        row = db.fetch(f"SELECT {', '.join(MEDIA_COLUMNS)} FROM source_media WHERE content_hash = %s;", args=(content_hash,), one=True)
+        if row:
+            return row
+
+    media = probe(path)
+    if content_hash:
+        query = f"""
+            INSERT INTO source_media (content_hash, {', '.join(MEDIA_COLUMNS)}, probed_at)
+            VALUES (%s, {', '.join(['%s'] * len(MEDIA_COLUMNS))}, %s)
+            ON CONFLICT (content_hash) DO NOTHING;"""
+        db.update(query, args=(content_hash, *(media[column] for column in MEDIA_COLUMNS), datetime.datetime.now()))
+    return media
+
+def _rate(rate):
+    """Frames per second from an ffprobe "num/den" rate"""
+    try:
+        num, _, den = (rate or "").partition("/")
+        return float(num) / float(den or 1) or None
+    except (ValueError, ZeroDivisionError):
+        return None
+
+def _rotation(stream):
+    rotation = stream.get("tags", {}).get("rotate")
+    for side_data in stream.get("side_data_list", []):
+        if "rotation" in side_data:
+            rotation = side_data["rotation"]
+    try:
+        return int(float(rotation or 0)) % 360
+    except ValueError:
+        return 0
+
+if __name__ == "__main__":
+    # Ingest, probe every gameplay that has no metadata yet
+    import os
+    from bg_db import db
+
+    worker_db = db()
+    try:
+        for row in worker_db.fetch("SELECT id FROM gameplays WHERE duration IS NULL OR keyframes IS NULL;"):
+            try:
+                gameplay_metadata(worker_db, row["id"], os.path.join(Config.gameplayDirectory, f"{row['id']}.mp4"))
+                logging.info(f"Probed gameplay {row['id']}")
+            except Exception as e:
+                logging.error(f"Failed to probe gameplay {row['id']}: {e}")
+    finally:
+        worker_db.put_connection()
@@ -0,0 +1,129 @@
+import os
+import json
+import socket
+import logging
+import resource
+from config import Config
+from redis_pool import redis_client
+from db_pool import conn_pool
+import prepared
+
+# Setup logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Upper bounds of the stage duration histogram, in seconds
+STAGE_BUCKETS = (0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+def peak_rss_kb():
+    """Peak resident set size of this process and of its largest finished child over its lifetime, in KB"""
+    # ru_maxrss is in KB on Linux
+    return (
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    )
+
+def observe_stage(stage, seconds):
+    """Add a stage duration to the histogram shared by all processes"""
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        for bound in STAGE_BUCKETS:
+            if seconds <= bound:
+                pipe.hincrby("metrics:stage_bucket", f"{stage}|{bound}", 1)
+        pipe.hincrby("metrics:stage_count", stage, 1)
+        pipe.hincrbyfloat("metrics:stage_sum", stage, seconds)
+        pipe.execute()
+    except Exception as e:
+        logging.warning(f"Failed to record stage metric: {e}")
+
+def count(name, amount=1, label=""):
+    """Increment a counter shared by all processes"""
+    try:
+        redis_client.hincrbyfloat(f"metrics:counter:{name}", label, amount)
+    except Exception as e:
+        logging.warning(f"Failed to record counter {name}: {e}")
+
+def process_gauges():
+    """Gauges only this process can read, its memory, pool and prepared query stats"""
+    rss, children_rss = peak_rss_kb()
+    return {
+        "peak_rss_kb": rss,
+        "children_peak_rss_kb": children_rss,
+        "pool": conn_pool.metrics(),
+        "queries": prepared.stats()
+    }
+
+def report_process(role):
+    """Publish this process' gauges for the scrape endpoint, they expire with the process"""
+    try:
+        key = f"metrics:process:{role}:{socket.gethostname()}:{os.getpid()}"
+        redis_client.set(key, json.dumps(process_gauges()), ex=Config.metricsProcessTtl)
+    except Exception as e:
+        logging.warning(f"Failed to report process metrics: {e}")
+
+def render():
+    """Everything collected so far in the Prometheus text exposition format"""
+    lines = []
+
+    lines.append("# HELP reels_stage_seconds Wall clock time of job stages")
+    lines.append("# TYPE reels_stage_seconds histogram")
+    buckets = _hash("metrics:stage_bucket")
+    sums = _hash("metrics:stage_sum")
+    for stage, stage_count in sorted(_hash("metrics:stage_count").items()):
+        for bound in STAGE_BUCKETS:
+            lines.append(f'reels_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {int(float(buckets.get(f"{stage}|{bound}", 0)))}')
+        lines.append(f'reels_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {int(float(stage_count))}')
+        lines.append(f'reels_stage_seconds_sum{{stage="{stage}"}} {float(sums.get(stage, 0))}')
+        lines.append(f'reels_stage_seconds_count{{stage="{stage}"}} {int(float(stage_count))}')
+
+    for name, help_text in (("frames_encoded", "Frames encoded by the render engines"), ("jobs", "Jobs by final status")):
+        values = _hash(f"metrics:counter:{name}")
+        lines.append(f"# HELP reels_{name}_total {help_text}")
+        lines.append(f"# TYPE reels_{name}_total counter")
+        for label, value in sorted(values.items()):
+            labels = f'{{status="{label}"}}' if label else ""
+            lines.append(f"reels_{name}_total{labels} {float(value)}")
+
+    processes = []
+    try:
+        for key in redis_client.scan_iter("metrics:process:*"):
+            _, _, role, host, pid = key.decode().split(":", 4)
+            data = redis_client.get(key)
+            if data:
+                processes.append((role, host, pid, json.loads(data)))
+    except Exception as e:
+        logging.warning(f"Failed to read process metrics: {e}")
+
+    gauges = (
+        ("peak_rss_kb", "Peak resident set size of the process", lambda gauge: gauge["peak_rss_kb"]),
+        ("children_peak_rss_kb", "Peak resident set size of the largest ffmpeg child", lambda gauge: gauge["children_peak_rss_kb"]),
+        ("db_pool_in_use", "Database connections checked out", lambda gauge: gauge["pool"]["in_use"]),
+        ("db_pool_idle", "Database connections idle in the pool", lambda gauge: gauge["pool"]["idle"]),
+        ("db_pool_wait_seconds_total", "Time spent waiting for a database connection", lambda gauge: gauge["pool"]["wait_seconds_total"]),
+        ("db_pool_timeouts_total", "Checkouts that gave up waiting", lambda gauge: gauge["pool"]["timeouts"]),
+        ("db_pool_leaked", "Connections held longer than the leak threshold", lambda gauge: gauge["pool"]["leaked"])
+    )
+    for name, help_text, value in gauges:
+        lines.append(f"# HELP reels_{name} {help_text}")
+        lines.append(f"# TYPE reels_{name} {'counter' if name.endswith('_total') else 'gauge'}")
+        for role, host, pid, gauge in processes:
+            lines.append(f'reels_{name}{{role="{role}",host="{host}",pid="{pid}"}} {value(gauge)}')
+
+    lines.append("# HELP reels_query_seconds_total Time spent in prepared queries")
+    lines.append("# TYPE reels_query_seconds_total counter")
+    for role, host, pid, gauge in processes:
+        for query, stat in sorted(gauge["queries"].items()):
+            lines.append(f'reels_query_seconds_total{{role="{role}",host="{host}",pid="{pid}",query="{query}"}} {stat["total_seconds"]}')
+    lines.append("# HELP reels_query_calls_total Prepared query executions")
+    lines.append("# TYPE reels_query_calls_total counter")
+    for role, host, pid, gauge in processes:
+        for query, stat in sorted(gauge["queries"].items()):
+            lines.append(f'reels_query_calls_total{{role="{role}",host="{host}",pid="{pid}",query="{query}"}} {stat["calls"]}')
+
+    return "\n".join(lines) + "\n"
+
+def _hash(key):
+    try:
+        return {field.decode(): value.decode() for field, value in redis_client.hgetall(key).items()}
+    except Exception as e:
+        logging.warning(f"Failed to read {key}: {e}")
+        return {}
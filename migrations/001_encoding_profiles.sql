@@ -0,0 +1,5 @@
+-- Named encoding profile per configuration and encode stats per job
+ALTER TABLE video_configurations ADD COLUMN IF NOT EXISTS encoding_profile TEXT NOT NULL DEFAULT 'standard';
+
+ALTER TABLE video_jobs ADD COLUMN IF NOT EXISTS encoding_profile TEXT;
+ALTER TABLE video_jobs ADD COLUMN IF NOT EXISTS encode_seconds REAL;
@@ -0,0 +1,3 @@
+-- Transfer stats reported by the downloader
+ALTER TABLE video_jobs ADD COLUMN IF NOT EXISTS download_bytes BIGINT;
+ALTER TABLE video_jobs ADD COLUMN IF NOT EXISTS download_bytes_per_sec REAL;
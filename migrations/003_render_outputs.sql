@@ -0,0 +1,9 @@
+-- Render memoization, jobs with the same render key share one output file
+ALTER TABLE video_jobs ADD COLUMN IF NOT EXISTS render_key TEXT;
+ALTER TABLE video_jobs ADD COLUMN IF NOT EXISTS output_file TEXT;
+
+CREATE TABLE IF NOT EXISTS render_outputs (
+    render_key TEXT PRIMARY KEY,
+    file_name TEXT NOT NULL,
+    created_at TIMESTAMP NOT NULL
+);
@@ -0,0 +1,4 @@
+-- Composite indexes matching the keyset listings, users.ig_id is already covered by its unique constraint
+CREATE INDEX IF NOT EXISTS video_jobs_user_created_idx ON video_jobs (user_id, created_at, id);
+CREATE INDEX IF NOT EXISTS video_jobs_user_status_created_idx ON video_jobs (user_id, status, created_at, id);
+CREATE INDEX IF NOT EXISTS video_configurations_user_created_idx ON video_configurations (user_id, created_at);
@@ -0,0 +1,17 @@
+-- Per stage wall clock time and resource use of each job
+CREATE TABLE IF NOT EXISTS job_metrics (
+    job_id TEXT PRIMARY KEY,
+    download_seconds REAL,
+    prepare_seconds REAL,
+    gameplay_seconds REAL,
+    render_seconds REAL,
+    load_seconds REAL,
+    composite_seconds REAL,
+    encode_seconds REAL,
+    finalize_seconds REAL,
+    frames INTEGER,
+    encode_fps REAL,
+    peak_rss_kb BIGINT,
+    children_peak_rss_kb BIGINT,
+    FOREIGN KEY (job_id) REFERENCES video_jobs(id) ON DELETE CASCADE
+);
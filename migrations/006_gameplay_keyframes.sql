@@ -0,0 +1,2 @@
+-- Keyframe timestamps of each gameplay file, probed once on first use
+ALTER TABLE gameplays ADD COLUMN IF NOT EXISTS keyframes REAL[];
@@ -0,0 +1,23 @@
+-- ffprobe metadata, on gameplay rows and per downloaded source content hash
+ALTER TABLE gameplays ADD COLUMN IF NOT EXISTS width INTEGER;
+ALTER TABLE gameplays ADD COLUMN IF NOT EXISTS height INTEGER;
+ALTER TABLE gameplays ADD COLUMN IF NOT EXISTS fps REAL;
+ALTER TABLE gameplays ADD COLUMN IF NOT EXISTS codec TEXT;
+ALTER TABLE gameplays ADD COLUMN IF NOT EXISTS rotation INTEGER;
+ALTER TABLE gameplays ADD COLUMN IF NOT EXISTS has_audio BOOLEAN;
+ALTER TABLE gameplays ADD COLUMN IF NOT EXISTS audio_codec TEXT;
+ALTER TABLE gameplays ADD COLUMN IF NOT EXISTS duration REAL;
+
+CREATE TABLE IF NOT EXISTS source_media (
+    content_hash TEXT PRIMARY KEY,
+    width INTEGER NOT NULL,
+    height INTEGER NOT NULL,
+    fps REAL,
+    codec TEXT,
+    rotation INTEGER,
+    has_audio BOOLEAN,
+    audio_codec TEXT,
+    duration REAL,
+    keyframes REAL[],
+    probed_at TIMESTAMP NOT NULL
+);
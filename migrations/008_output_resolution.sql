@@ -0,0 +1,2 @@
+-- Largest output size per configuration, sources above it are downscaled at decode
+ALTER TABLE video_configurations ADD COLUMN IF NOT EXISTS max_resolution TEXT NOT NULL DEFAULT '1080p';
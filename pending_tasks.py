@@ -0,0 +1,64 @@
+import json
+from config import Config
+from redis_pool import redis_client
+
+# Remove and return one pending entry, the given member or else the newest one
+# A config name claim also leaves a marker, so the default task can tell it from an expired entry
+_claim_script = redis_client.register_script("""
+local member = ARGV[1]
+if member == '' then
+    member = redis.call('ZREVRANGE', KEYS[1], 0, 0)[1]
+    if not member then
+        return false
+    end
+end
+if redis.call('ZREM', KEYS[1], member) == 0 then
+    return false
+end
+local payload = redis.call('HGET', KEYS[2], member)
+redis.call('HDEL', KEYS[2], member)
+if ARGV[2] ~= '' then
+    redis.call('SET', ARGV[2] .. member, 1, 'EX', ARGV[3])
+end
+return payload
+""")
+
+class PendingTasks:
+    """Reels waiting for a config name, a sorted set per sender scored by webhook timestamp"""
+
+    def __init__(self, sender_igsid) -> None:
+        self.index_key = f"pending:{sender_igsid}"
+        self.payloads_key = f"pending:{sender_igsid}:payloads"
+        self.claimed_prefix = f"pending:{sender_igsid}:claimed:"
+
+    @staticmethod
+    def member(payload):
+        return payload["reel_video_id"] if payload["type"] == "attachment" else payload["url"]
+
+    def add(self, payload, task_data, timestamp):
+        member = PendingTasks.member(payload)
+        # Outlive the default task's countdown, then let Redis drop anything left behind
+        ttl = Config.countdown + Config.pendingTaskTtlMargin
+        pipe = redis_client.pipeline()
+        pipe.zadd(self.index_key, {member: timestamp})
+        pipe.hset(self.payloads_key, member, json.dumps(task_data))
+        pipe.expire(self.index_key, ttl)
+        pipe.expire(self.payloads_key, ttl)
+        pipe.execute()
+
+    def claim_latest(self):
+        """Atomically take the newest pending reel for a config name"""
+        return self._claim("", mark=True)
+
+    def claim(self, payload):
+        """Atomically take this reel, None if it was already claimed or has expired"""
+        return self._claim(PendingTasks.member(payload))
+
+    def was_claimed(self, payload):
+        """True when a config name took this reel, as opposed to its entry expiring"""
+        return bool(redis_client.exists(self.claimed_prefix + PendingTasks.member(payload)))
+
+    def _claim(self, member, mark=False):
+        args = [member, self.claimed_prefix if mark else "", Config.pendingClaimTtl]
+        task_data = _claim_script(keys=[self.index_key, self.payloads_key], args=args)
+        return json.loads(task_data) if task_data else None
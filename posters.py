@@ -0,0 +1,72 @@
+import os
+import subprocess
+import logging
+from config import Config
+import media_probe
+from moviepy.config import FFMPEG_BINARY
+
+# Setup logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+def poster_name(file_name):
+    """Poster stored next to an output, renders shared between jobs share it too"""
+    return os.path.splitext(file_name)[0] + ".jpg"
+
+def preview_name(file_name):
+    return os.path.splitext(file_name)[0] + ".preview.gif"
+
+def generate(output_path):
+    """Create the poster frame and animated preview of an output if they don't exist yet"""
+    directory, file_name = os.path.split(output_path)
+    offset = _seek_offset(output_path)
+
+    poster_path = os.path.join(directory, poster_name(file_name))
+    if not os.path.exists(poster_path):
+        # Input seek lands on the keyframe before offset and only keyframes are decoded
+        _write(poster_path, [
+            FFMPEG_BINARY, "-y", "-loglevel", "error",
+            "-skip_frame", "nokey", "-noaccurate_seek", "-ss", f"{offset:.3f}", "-i", output_path,
+            "-frames:v", "1", "-vf", f"scale={Config.posterWidth}:-2", "-q:v", "3"
+        ])
+
+    preview_path = os.path.join(directory, preview_name(file_name))
+    if not os.path.exists(preview_path):
+        # Decodes only the preview window after the same seek
+        _write(preview_path, [
+            FFMPEG_BINARY, "-y", "-loglevel", "error",
+            "-ss", f"{offset:.3f}", "-t", str(Config.previewSeconds), "-i", output_path,
+            "-an", "-filter_complex",
+            f"fps={Config.previewFps},scale={Config.previewWidth}:-2:flags=lanczos,split[a][b];[a]palettegen[p];[b][p]paletteuse",
+            "-loop", "0"
+        ])
+    return poster_path, preview_path
+
+def remove(file_name):
+    """Delete the poster and preview of an output"""
+    for name in (poster_name(file_name), preview_name(file_name)):
+        try:
+            os.remove(os.path.join(Config.outputDirectory, name))
+        except FileNotFoundError:
+            pass
+
+def _seek_offset(path):
+    """A point early in the video, past fades in the first frames"""
+    try:
+        duration = media_probe.probe(path, keyframes=False)["duration"]
+    except (subprocess.CalledProcessError, media_probe.MediaError):
+        return 0.0
+    return min(duration * Config.posterPosition, max(duration - Config.previewSeconds, 0.0))
+
+def _write(path, command):
+    # Written beside the target and renamed, a half written file is never served
+    root, ext = os.path.splitext(path)
+    tmp_path = f"{root}.{os.getpid()}.tmp{ext}"
+    try:
+        subprocess.run([*command, tmp_path], check=True, capture_output=True)
+        os.replace(tmp_path, path)
+    except subprocess.CalledProcessError as e:
+        logging.error(f"ffmpeg failed: {e.stderr.decode(errors='replace')}")
+        raise
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
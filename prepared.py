@@ -0,0 +1,155 @@
+import time
+import hashlib
+import logging
+import threading
+import weakref
+import psycopg2
+import psycopg2.errors
+import psycopg2.extensions
+from config import Config
+
+# Setup logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Columns of the cached rows, spelled out so a new column doesn't change a prepared statement's result type
+USER_COLUMNS = "id, email, first_name, last_name, register_date, ig_id, ig_username, default_config_id"
+CONFIG_COLUMNS = """id, user_id, config_name, split_type, video_position, edit_type, original_video_percentage,
+    encoding_profile, max_resolution, created_at"""
+
+# Hot queries, prepared once per pooled connection on first use
+QUERIES = {
+    "user_by_id": f"SELECT {USER_COLUMNS} FROM users WHERE id = $1",
+    "user_id_by_ig_id": "SELECT id FROM users WHERE ig_id = $1",
+    "user_by_ig_id": f"SELECT {USER_COLUMNS} FROM users WHERE ig_id = $1",
+    "configs_by_user": f"SELECT {CONFIG_COLUMNS} FROM video_configurations WHERE user_id = $1",
+    "dashboard": """
+        SELECT
+            vc.id,
+            vc.config_name,
+            vc.split_type,
+            vc.video_position,
+            vc.edit_type,
+            vc.original_video_percentage,
+            vc.created_at,
+            CASE
+                WHEN vc.id = u.default_config_id THEN 1
+                ELSE 0
+            END AS is_default
+        FROM
+            video_configurations vc
+        JOIN
+            users u
+        ON u.id = vc.user_id
+        WHERE
+            vc.user_id = $1
+        ORDER BY
+            created_at DESC""",
+    # Keyset pages, the first page starts after ('infinity', '')
+    "progress": """
+        SELECT
+            vj.id,
+            vj.caption,
+            g.title,
+            vc.config_name,
+            vj.status,
+            vj.created_at
+        FROM
+            video_jobs vj
+        LEFT JOIN
+            video_configurations vc ON vj.config_id = vc.id
+        LEFT JOIN
+            gameplays g ON vj.gameplay_id = g.id
+        WHERE
+            vj.user_id = $1 AND (vj.created_at, vj.id) < ($2, $3)
+        ORDER BY
+            vj.created_at DESC, vj.id DESC
+        LIMIT $4""",
+    "outputs": """
+        SELECT
+            vj.id,
+            vj.caption,
+            vj.created_at
+        FROM
+            video_jobs vj
+        WHERE
+            vj.user_id = $1 AND vj.status = 'completed' AND (vj.created_at, vj.id) < ($2, $3)
+        ORDER BY
+            vj.created_at DESC, vj.id DESC
+        LIMIT $4""",
+    "gameplays": "SELECT id, title, category, length_seconds, size_kb FROM gameplays WHERE id > $1 ORDER BY id LIMIT $2"
+}
+
+# Names already prepared on each connection
+_prepared = weakref.WeakKeyDictionary()
+# Names whose server-side statement is out of date and must be deallocated before preparing again
+_stale = weakref.WeakKeyDictionary()
+_stats = {}
+_lock = threading.Lock()
+_calls = 0
+
+def job_update(columns):
+    """Register and return the named UPDATE for this set of video_jobs columns"""
+    # Postgres truncates identifiers at 63 bytes, so the column list goes into a fixed-length digest
+    name = "job_update_" + hashlib.sha1(",".join(columns).encode()).hexdigest()[:12]
+    if name not in QUERIES:
+        assignments = ", ".join(f"{column} = ${i}" for i, column in enumerate(columns, start=1))
+        QUERIES[name] = f"UPDATE video_jobs SET {assignments} WHERE id = ${len(columns) + 1}"
+    return name
+
+def execute(cur, name, args=()):
+    """EXECUTE a registered query on cur, preparing it on this connection first if needed"""
+    conn = cur.connection
+    with _lock:
+        names = _prepared.setdefault(conn, set())
+
+    start = time.perf_counter()
+    # Only a statement that opens its own transaction can be retried after an error
+    retryable = conn.status == psycopg2.extensions.STATUS_READY
+    try:
+        _execute(cur, names, name, args)
+    except psycopg2.errors.FeatureNotSupported as e:
+        # "cached plan must not change result type", a migration changed a table under the statement
+        logging.warning(f"Re-preparing {name}: {e}")
+        with _lock:
+            names.discard(name)
+            _stale.setdefault(conn, set()).add(name)
+        if not retryable:
+            raise
+        conn.rollback()
+        _execute(cur, names, name, args)
+    _record(name, time.perf_counter() - start)
+    return cur
+
+def _execute(cur, names, name, args):
+    if name not in names:
+        with _lock:
+            stale = name in _stale.get(cur.connection, ())
+            if stale:
+                _stale[cur.connection].discard(name)
+        if stale:
+            cur.execute(f"DEALLOCATE {name}")
+        cur.execute(f"PREPARE {name} AS {QUERIES[name]}")
+        names.add(name)
+    if args:
+        cur.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(args))})", args)
+    else:
+        cur.execute(f"EXECUTE {name}")
+
+def _record(name, seconds):
+    global _calls
+    with _lock:
+        calls, total, slowest = _stats.get(name, (0, 0.0, 0.0))
+        _stats[name] = (calls + 1, total + seconds, max(slowest, seconds))
+        _calls += 1
+        report = _calls % Config.dbStatsLogEvery == 0
+    if report:
+        for query, stat in stats().items():
+            logging.info(f"Query {query}: {stat['calls']} calls, {stat['mean_ms']:.2f}ms mean, {stat['max_ms']:.2f}ms max")
+
+def stats():
+    """Per query call counts and latency in this process"""
+    with _lock:
+        return {
+            name: {"calls": calls, "total_seconds": total, "mean_ms": total / calls * 1000, "max_ms": slowest * 1000}
+            for name, (calls, total, slowest) in _stats.items()
+        }
@@ -0,0 +1,5 @@
+import redis
+from config import Config
+
+# Shared by the app and the workers, connections are opened lazily per process
+redis_client = redis.Redis(host=Config.redisHost, port=Config.redisPort, db=Config.redisDb)
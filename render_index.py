@@ -0,0 +1,70 @@
+import os
+import json
+import hashlib
+import datetime
+import logging
+from config import Config
+import posters
+
+# Setup logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+class RenderIndex:
+    """Map (source content, gameplay, render parameters) to an already rendered output"""
+
+    def __init__(self, db) -> None:
+        self.db = db
+
+    @staticmethod
+    def render_key(source_hash, gameplay_id, config):
+        """Hash the inputs that decide what a render looks like"""
+        params = {
+            "source": source_hash,
+            "gameplay": gameplay_id,
+            "split_type": config.get("split_type"),
+            "video_position": config.get("video_position"),
+            "edit_type": config.get("edit_type"),
+            # A fitted vertical split ignores the percentage
+            "percentage": None if config.get("edit_type") == "fit" else config.get("original_video_percentage"),
+            "encoding_profile": config.get("encoding_profile") or Config.defaultEncodingProfile,
+            "max_resolution": config.get("max_resolution") or Config.defaultOutputResolution
+        }
+        return hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()
+
+    def lookup(self, render_key):
+        """Return the output file name rendered for this key, if it still exists"""
+        row = self.db.fetch("SELECT file_name FROM render_outputs WHERE render_key = %s;", args=(render_key,), one=True)
+        if row and os.path.exists(os.path.join(Config.outputDirectory, row["file_name"])):
+            return row["file_name"]
+        return None
+
+    def register(self, render_key, file_name, cur=None):
+        """Record the output of a render, on cur when part of a larger transaction"""
+        query = "INSERT INTO render_outputs (render_key, file_name, created_at) VALUES (%s, %s, %s) ON CONFLICT (render_key) DO NOTHING;"
+        args = (render_key, file_name, datetime.datetime.now())
+        if cur:
+            cur.execute(query, args)
+        else:
+            self.db.update(query, args=args)
+
+    @staticmethod
+    def cleanup(db):
+        """Delete outputs no job references any more, a job counts as one reference"""
+        query = """
+            DELETE FROM
+                render_outputs ro
+            WHERE
+                NOT EXISTS (SELECT 1 FROM video_jobs vj WHERE vj.render_key = ro.render_key)
+            RETURNING
+                ro.file_name;"""
+        with db.execute(query, commit=True) as cur:
+            file_names = [row[0] for row in cur.fetchall()]
+
+        for file_name in file_names:
+            posters.remove(file_name)
+            try:
+                os.remove(os.path.join(Config.outputDirectory, file_name))
+                logging.info(f"Removed unreferenced output {file_name}")
+            except FileNotFoundError:
+                pass
+        return len(file_names)
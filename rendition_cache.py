@@ -0,0 +1,128 @@
+import os
+import time
+import subprocess
+import logging
+from uuid import uuid4
+from config import Config
+from editor import Editor
+import media_probe
+import rusage
+from redis_pool import redis_client
+from moviepy.config import FFMPEG_BINARY
+
+# Setup logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Deletes the build lock only if it's still the caller's, an expired one may belong to another builder by now
+_release_lock = redis_client.register_script("""
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0""")
+
+class RenditionCache:
+    """Gameplay footage pre-scaled, pre-cropped and muted per target size, evicted LRU by size"""
+
+    def __init__(self, directory=Config.renditionDirectory, max_bytes=Config.renditionCacheMaxBytes) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path_for(self, gameplay_id, width, height):
+        return os.path.join(self.directory, f"{gameplay_id}_{width}x{height}.mp4")
+
+    def get(self, gameplay_id, width, height):
+        """Return the rendition path, building it on a miss, call it when the render starts"""
+        path = self.path_for(gameplay_id, width, height)
+        if self._touch(path):
+            return path
+
+        # One worker builds a rendition, the others wait for its file instead of transcoding it again
+        lock = f"rendition_build:{os.path.basename(path)}"
+        token = uuid4().hex
+        while not redis_client.set(lock, token, nx=True, ex=Config.renditionBuildLockSeconds):
+            time.sleep(Config.renditionBuildPollSeconds)
+            if self._touch(path):
+                return path
+        try:
+            # Built by the lock's previous holder
+            if self._touch(path):
+                return path
+            logging.info(f"Building gameplay rendition {gameplay_id} at {width}x{height}")
+            self._build(gameplay_id, width, height, path)
+        finally:
+            _release_lock(keys=[lock], args=[token])
+        self.evict()
+        return path
+
+    def warm(self, config, gameplay_ids):
+        """Build renditions a config will need for the usual reel sizes"""
+        for width, height in Config.renditionPrewarmSizes:
+            target_width, target_height = Editor.layout(config, *Editor.source_size(config, width, height))["gameplay_size"]
+            for gameplay_id in gameplay_ids:
+                try:
+                    self.get(gameplay_id, target_width, target_height)
+                except Exception as e:
+                    logging.error(f"Failed to warm rendition {gameplay_id}: {e}")
+
+    def evict(self):
+        """Remove least recently used renditions until the cache fits, sparing ones renders may be reading"""
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.endswith(".mp4"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in entries)
+        in_use_after = time.time() - Config.renditionInUseSeconds
+        for mtime, size, path in sorted(entries):
+            if total <= self.max_bytes or mtime > in_use_after:
+                break
+            try:
+                os.remove(path)
+                total -= size
+                logging.info(f"Evicted gameplay rendition {path}")
+            except FileNotFoundError:
+                pass
+
+    @staticmethod
+    def _touch(path):
+        """Mark as recently used, which also keeps it from eviction for the render, False when missing"""
+        try:
+            os.utime(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _build(self, gameplay_id, width, height, path):
+        source = os.path.join(Config.gameplayDirectory, f"{gameplay_id}.mp4")
+        # Keyframes land where the source has them, so the stored keyframe index seeks cleanly here too
+        media = media_probe.probe(source)
+        source_width, source_height = media["width"], media["height"]
+        keyframes = media["keyframes"]
+
+        # Same geometry Editor applies to gameplay on every render
+        scaled_width, scaled_height = Editor.smart_resize_size(source_width, source_height, width, height)
+        x1, y1, x2, y2 = Editor.center_weighted_box(scaled_width, scaled_height, width, height)
+
+        # Write to a private name first so concurrent builders never see a partial file
+        tmp_path = f"{path}.{uuid4().hex}.tmp"
+        command = [
+            FFMPEG_BINARY, "-y", "-loglevel", "error",
+            "-i", source,
+            "-vf", f"scale={scaled_width}:{scaled_height},crop={x2 - x1}:{y2 - y1}:{x1}:{y1},setsar=1",
+            "-an",
+            "-c:v", "libx264", "-preset", "veryfast", "-crf", "18",
+            *(["-force_key_frames", ",".join(f"{keyframe:.3f}" for keyframe in keyframes)] if keyframes else []),
+            "-pix_fmt", "yuv420p",
+            "-f", "mp4", tmp_path
+        ]
+        try:
+            rusage.run(command)
+            os.replace(tmp_path, path)
+        except subprocess.CalledProcessError as e:
+            logging.error(f"ffmpeg failed: {e.stderr.decode(errors='replace')}")
+            raise
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
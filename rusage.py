@@ -0,0 +1,67 @@
+import os
+import logging
+import resource
+import subprocess
+import tempfile
+import threading
+
+# Setup logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Largest peak of a child reaped through wait() since the last reset, in KB
+_children_peak = 0
+_lock = threading.Lock()
+
+def reset():
+    """Start measuring peaks afresh, workers call it before each job stage"""
+    global _children_peak
+    with _lock:
+        _children_peak = 0
+    try:
+        # 5 resets the process' VmHWM to its current resident set size
+        with open("/proc/self/clear_refs", "w") as file:
+            file.write("5")
+    except OSError as e:
+        logging.debug(f"Couldn't reset peak memory: {e}")
+
+def peak_kb():
+    """Peak resident set size of this process and of its largest reaped child since reset(), in KB"""
+    return _self_peak_kb(), _children_peak
+
+def wait(process):
+    """Popen.wait() that keeps the child's peak resident set size"""
+    _, status, usage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    _observe_child(usage.ru_maxrss)
+    return process.returncode
+
+def run(command):
+    """subprocess.run(command, check=True, capture_output=True) for commands whose stdout isn't needed, reaped through wait()"""
+    with tempfile.TemporaryFile() as stderr:
+        process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=stderr)
+        try:
+            returncode = wait(process)
+        except BaseException:
+            # A time limit, don't leave ffmpeg running behind the task
+            process.kill()
+            wait(process)
+            raise
+        if returncode:
+            stderr.seek(0)
+            raise subprocess.CalledProcessError(returncode, command, stderr=stderr.read())
+
+def _observe_child(maxrss):
+    global _children_peak
+    with _lock:
+        _children_peak = max(_children_peak, maxrss)
+
+def _self_peak_kb():
+    try:
+        with open("/proc/self/status") as file:
+            for line in file:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    # No procfs, ru_maxrss (KB on Linux) is the peak over the process' lifetime
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
@@ -14,7 +14,16 @@ CREATE TABLE IF NOT EXISTS gameplays (
     title TEXT NOT NULL,
     category TEXT NOT NULL,
     length_seconds INTEGER NOT NULL,
-    size_kb INTEGER NOT NULL
+    size_kb INTEGER NOT NULL,
+    width INTEGER,
+    height INTEGER,
+    fps REAL,
+    codec TEXT,
+    rotation INTEGER,
+    has_audio BOOLEAN,
+    audio_codec TEXT,
+    duration REAL,
+    keyframes REAL[]
 );
 
 CREATE TABLE IF NOT EXISTS video_configurations (
@@ -25,6 +34,8 @@ CREATE TABLE IF NOT EXISTS video_configurations (
     video_position TEXT CHECK (video_position IN ('left', 'right', 'top', 'bottom')),
     edit_type TEXT CHECK (edit_type IN ('crop', 'fit')),
     original_video_percentage INTEGER CHECK(original_video_percentage BETWEEN 0 AND 100),
+    encoding_profile TEXT NOT NULL DEFAULT 'standard',
+    max_resolution TEXT NOT NULL DEFAULT '1080p',
     created_at TIMESTAMP NOT NULL,
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
 );
@@ -47,8 +58,55 @@ CREATE TABLE IF NOT EXISTS video_jobs (
     video_type TEXT CHECK (video_type IN ('tiktok', 'youtube', 'instagram')),
     status TEXT CHECK (status IN ('pending', 'downloaded', 'processing', 'completed', 'failed')) DEFAULT 'pending',
     processing_errors TEXT,
+    encoding_profile TEXT,
+    encode_seconds REAL,
+    download_bytes BIGINT,
+    download_bytes_per_sec REAL,
+    render_key TEXT,
+    output_file TEXT,
     created_at TIMESTAMP NOT NULL,
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
     FOREIGN KEY (config_id) REFERENCES video_configurations(id) ON DELETE SET NULL,
     FOREIGN KEY (gameplay_id) REFERENCES gameplays(id) ON DELETE SET NULL
-);
\ No newline at end of file
+);
+
+CREATE TABLE IF NOT EXISTS render_outputs (
+    render_key TEXT PRIMARY KEY,
+    file_name TEXT NOT NULL,
+    created_at TIMESTAMP NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS job_metrics (
+    job_id TEXT PRIMARY KEY,
+    download_seconds REAL,
+    prepare_seconds REAL,
+    gameplay_seconds REAL,
+    render_seconds REAL,
+    load_seconds REAL,
+    composite_seconds REAL,
+    encode_seconds REAL,
+    finalize_seconds REAL,
+    frames INTEGER,
+    encode_fps REAL,
+    peak_rss_kb BIGINT,
+    children_peak_rss_kb BIGINT,
+    FOREIGN KEY (job_id) REFERENCES video_jobs(id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS source_media (
+    content_hash TEXT PRIMARY KEY,
+    width INTEGER NOT NULL,
+    height INTEGER NOT NULL,
+    fps REAL,
+    codec TEXT,
+    rotation INTEGER,
+    has_audio BOOLEAN,
+    audio_codec TEXT,
+    duration REAL,
+    keyframes REAL[],
+    probed_at TIMESTAMP NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS video_jobs_user_created_idx ON video_jobs (user_id, created_at, id);
+CREATE INDEX IF NOT EXISTS video_jobs_user_status_created_idx ON video_jobs (user_id, status, created_at, id);
+CREATE INDEX IF NOT EXISTS video_configurations_user_created_idx ON video_configurations (user_id, created_at);
@@ -0,0 +1,98 @@
+import os
+import subprocess
+import tempfile
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from config import Config
+from ffmpeg_editor import FFmpegEditor
+from encoding import ffmpeg_audio_args
+from media_probe import probe_keyframes
+from moviepy.config import FFMPEG_BINARY
+import rusage
+
+# Setup logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+class SegmentedEditor(FFmpegEditor):
+    """Render long videos as keyframe aligned segments in parallel, then join them without re-encoding"""
+
+    def start_editing(self, video_id):
+        if self.duration < Config.segmentMinSeconds:
+            return super().start_editing(video_id)
+
+        try:
+            output_path = os.path.join(Config.outputDirectory, video_id + ".mp4")
+            segments = self.segments()
+            logging.info(f"Rendering {video_id} in {len(segments)} segments")
+
+            start = time.perf_counter()
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                segment_paths = [os.path.join(tmp_dir, f"{i:04d}.mp4") for i in range(len(segments))]
+                # Video only, the audio is laid over the joined result in one piece
+                # Encoders split the cores between them instead of each sizing its threads to all of them
+                threads = max(1, (os.cpu_count() or 1) // Config.segmentWorkers)
+                commands = [
+                    self.build_command(path, start=seg_start, duration=seg_end - seg_start, audio=False, threads=threads)
+                    for path, (seg_start, seg_end) in zip(segment_paths, segments)
+                ]
+                # Each segment is its own ffmpeg process, threads only wait on them
+                with ThreadPoolExecutor(max_workers=Config.segmentWorkers) as pool:
+                    futures = [pool.submit(SegmentedEditor._run, command) for command in commands]
+                    done = 0.0
+                    for future, (seg_start, seg_end) in zip(futures, segments):
+                        future.result()
+                        # Collected in timeline order, so the reported share only grows
+                        done += seg_end - seg_start
+                        if self.on_progress:
+                            self.on_progress(done / self.duration)
+
+                list_path = os.path.join(tmp_dir, "segments.txt")
+                with open(list_path, "w") as file:
+                    for path in segment_paths:
+                        file.write(f"file '{path}'\n")
+
+                SegmentedEditor._run(self.concat_command(list_path, output_path))
+            self.encode_seconds = time.perf_counter() - start
+            return output_path
+
+        except subprocess.CalledProcessError as e:
+            logging.error(f"ffmpeg failed: {e.stderr.decode(errors='replace')}")
+            raise
+        except Exception as e:
+            logging.exception(f"Error during video editing: {e}")
+            raise
+
+    def segments(self):
+        """Split the timeline into (start, end) pairs cut on source keyframes"""
+        boundaries = [0.0]
+        for keyframe in self.keyframes():
+            # Leave the tail long enough to be worth its own process
+            if keyframe >= boundaries[-1] + Config.segmentSeconds and keyframe <= self.duration - Config.segmentSeconds / 2:
+                boundaries.append(keyframe)
+        boundaries.append(self.duration)
+        return list(zip(boundaries, boundaries[1:]))
+
+    def keyframes(self):
+        """Keyframe timestamps of the main video"""
+        if self.media.get("keyframes") is not None:
+            return self.media["keyframes"]
+        return probe_keyframes(self.video_path)
+
+    def concat_command(self, list_path, output_path):
+        """Stream copy the segments and mux the original audio over the whole timeline"""
+        return [
+            FFMPEG_BINARY, "-y", "-loglevel", "error",
+            "-f", "concat", "-safe", "0", "-i", list_path,
+            "-i", self.video_path,
+            "-map", "0:v",
+            *(["-map", "1:a", *ffmpeg_audio_args(self.media.get("audio_codec"))] if self.has_audio else []),
+            "-c:v", "copy",
+            "-t", f"{self.duration:.3f}",
+            "-movflags", "+faststart",
+            output_path
+        ]
+
+    @staticmethod
+    def _run(command):
+        rusage.run(command)
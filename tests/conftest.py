@@ -0,0 +1,14 @@
+import os
+import sys
+
+# Modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Config reads these at import, tests never reach the real services
+for name in (
+    "SECRET_KEY", "GOOGLE_CLIENT_ID", "GOOGLE_CLIENT_SECRET",
+    "IG_ID", "IG_ACCESS_TOKEN", "IG_APP_ID", "IG_APP_SECRET", "VERIFY_TOKEN",
+    "DB_DATABASE_NAME", "DB_USERNAME", "DB_PASSWORD", "DB_HOST"
+):
+    os.environ.setdefault(name, "test")
+os.environ.setdefault("DB_PORT", "5432")
@@ -0,0 +1,72 @@
+import base64
+import hashlib
+import time
+import pytest
+from config import Config
+import app as app_module
+from helpers import sign_media_path
+
+CONTENT = bytes(range(256)) * 64
+
+@pytest.fixture
+def output(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "outputDirectory", str(tmp_path))
+    (tmp_path / "out.mp4").write_bytes(CONTENT)
+    return "out.mp4"
+
+@pytest.fixture
+def client():
+    app_module.app.config["TESTING"] = True
+    return app_module.app.test_client()
+
+def signed_query(path, expires):
+    return {"md5": sign_media_path(path, expires), "expires": expires}
+
+def test_flask_mode_answers_range_requests(output, monkeypatch):
+    monkeypatch.setattr(Config, "deliveryMode", "flask")
+    with app_module.app.test_request_context("/download/job", headers={"Range": "bytes=100-199"}):
+        response = app_module.deliver_output(output, "job.mp4", False)
+        response.direct_passthrough = False
+
+        assert response.status_code == 206
+        assert response.headers["Content-Range"] == f"bytes 100-199/{len(CONTENT)}"
+        assert response.headers["Accept-Ranges"] == "bytes"
+        assert response.get_data() == CONTENT[100:200]
+
+def test_x_accel_mode_hands_off_to_nginx(output, monkeypatch):
+    monkeypatch.setattr(Config, "deliveryMode", "x-accel")
+    with app_module.app.test_request_context("/download/job"):
+        response = app_module.deliver_output(output, "job.mp4", True)
+
+    assert response.headers["X-Accel-Redirect"] == Config.accelRedirectPrefix + output
+    assert response.headers["Content-Disposition"] == 'attachment; filename="job.mp4"'
+    assert response.get_data() == b""
+
+def test_signature_matches_nginx_secure_link_md5():
+    expires = 1700000000
+    # secure_link_md5 "$secure_link_expires$uri <key>"
+    expected = hashlib.md5(f"{expires}/media/out.mp4 {Config.mediaSigningKey}".encode()).digest()
+    assert sign_media_path("/media/out.mp4", expires) == base64.urlsafe_b64encode(expected).decode().rstrip("=")
+
+def test_signed_mode_redirects_to_a_valid_url(output, client, monkeypatch):
+    monkeypatch.setattr(Config, "deliveryMode", "signed")
+    monkeypatch.setattr(Config, "signedUrlBase", "/media/")
+    with app_module.app.test_request_context("/download/job"):
+        response = app_module.deliver_output(output, "job.mp4", False)
+
+    assert response.status_code == 302
+    assert response.headers["Cache-Control"] == "private, no-store"
+    followed = client.get(response.headers["Location"], headers={"Range": "bytes=0-9"})
+    assert followed.status_code == 206
+    assert followed.data == CONTENT[:10]
+
+def test_media_rejects_bad_or_expired_signatures(output, client):
+    expires = int(time.time()) + 60
+    query = signed_query("/media/out.mp4", expires)
+    assert client.get("/media/out.mp4", query_string=query).status_code == 200
+
+    tampered = {**query, "md5": sign_media_path("/media/other.mp4", expires)}
+    assert client.get("/media/out.mp4", query_string=tampered).status_code == 403
+
+    expired = signed_query("/media/out.mp4", int(time.time()) - 1)
+    assert client.get("/media/out.mp4", query_string=expired).status_code == 403
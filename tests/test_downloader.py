@@ -0,0 +1,140 @@
+import os
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import requests
+from config import Config
+from downloader import Downloader, DownloadError
+
+CONTENT = os.urandom(256 * 1024)
+
+class Handler(BaseHTTPRequestHandler):
+    """Serves CONTENT, the path picks the behaviour under test"""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_HEAD(self):
+        if self.path == "/unknown-length":
+            self.send_response(405)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(CONTENT)))
+        if self.path != "/no-ranges":
+            self.send_header("Accept-Ranges", "bytes")
+        self.end_headers()
+
+    def do_GET(self):
+        self.server.requests.append((self.path, self.headers.get("Range")))
+        match = re.match(r"bytes=(\d+)-(\d*)", self.headers.get("Range") or "")
+
+        if self.path == "/unknown-length":
+            # Streamed without a length, only the running total can enforce the cap
+            self.send_response(200)
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.wfile.write(CONTENT)
+            self.close_connection = True
+            return
+
+        if match and self.path not in ("/no-ranges", "/ignores-ranges"):
+            begin = int(match.group(1))
+            end = int(match.group(2)) if match.group(2) else len(CONTENT) - 1
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {begin}-{end}/{len(CONTENT)}")
+            self.send_header("Content-Length", str(end - begin + 1))
+            self.end_headers()
+            self.wfile.write(CONTENT[begin:end + 1])
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(CONTENT)))
+        self.end_headers()
+        if self.path == "/drops" and not self.server.dropped:
+            # Half the promised body, then the connection goes away
+            self.server.dropped = True
+            self.wfile.write(CONTENT[:len(CONTENT) // 2])
+            self.close_connection = True
+            return
+        self.wfile.write(CONTENT)
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    httpd.requests = []
+    httpd.dropped = False
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+@pytest.fixture
+def downloader():
+    # A plain session, the shared one's retry backoff only slows the tests down
+    return Downloader(session=requests.Session())
+
+def url(server, path):
+    return f"http://127.0.0.1:{server.server_address[1]}{path}"
+
+def test_resumes_after_a_dropped_connection(server, downloader, tmp_path, monkeypatch):
+    # Only whole chunks reach the partial file
+    monkeypatch.setattr(Config, "downloadChunkSize", 16 * 1024)
+    target = str(tmp_path / "video.mp4")
+    stats = downloader.download(url(server, "/drops"), target)
+
+    assert open(target, "rb").read() == CONTENT
+    assert stats["bytes"] == len(CONTENT)
+    assert server.requests[-1] == ("/drops", f"bytes={len(CONTENT) // 2}-")
+
+def test_parallel_ranges(server, downloader, tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "downloadParallelMinBytes", 1)
+    monkeypatch.setattr(Config, "downloadChunkSize", 16 * 1024)
+    monkeypatch.setattr(Config, "downloadConnections", 4)
+    target = str(tmp_path / "video.mp4")
+    downloader.download(url(server, "/file"), target)
+
+    assert open(target, "rb").read() == CONTENT
+    ranges = sorted(int(re.match(r"bytes=(\d+)", header).group(1)) for _, header in server.requests)
+    assert len(ranges) == 4 and ranges[0] == 0
+
+def test_size_cap_from_content_length(server, downloader, tmp_path):
+    downloader.max_bytes = len(CONTENT) - 1
+    target = str(tmp_path / "video.mp4")
+    with pytest.raises(DownloadError):
+        downloader.download(url(server, "/file"), target)
+
+    assert server.requests == []
+    assert os.listdir(tmp_path) == []
+
+def test_size_cap_while_streaming_removes_the_partial_file(server, downloader, tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "downloadChunkSize", 16 * 1024)
+    downloader.max_bytes = len(CONTENT) // 2
+    target = str(tmp_path / "video.mp4")
+    with pytest.raises(DownloadError):
+        downloader.download(url(server, "/unknown-length"), target)
+
+    assert os.listdir(tmp_path) == []
+
+def test_server_without_ranges(server, downloader, tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "downloadParallelMinBytes", 1)
+    target = str(tmp_path / "video.mp4")
+    downloader.download(url(server, "/no-ranges"), target)
+
+    assert open(target, "rb").read() == CONTENT
+    assert server.requests == [("/no-ranges", None)]
+
+def test_server_ignoring_advertised_ranges(server, downloader, tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "downloadParallelMinBytes", 1)
+    monkeypatch.setattr(Config, "downloadChunkSize", 16 * 1024)
+    target = str(tmp_path / "video.mp4")
+    downloader.download(url(server, "/ignores-ranges"), target)
+
+    assert open(target, "rb").read() == CONTENT
+    assert server.requests[-1] == ("/ignores-ranges", None)
+    assert os.listdir(tmp_path) == ["video.mp4"]
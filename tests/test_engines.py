@@ -0,0 +1,77 @@
+import re
+import subprocess
+import numpy as np
+import pytest
+from moviepy.config import FFMPEG_BINARY
+from config import Config
+from editor import Editor
+from ffmpeg_editor import FFmpegEditor
+
+FPS = 10
+SECONDS = 2
+MAIN_SIZE = (320, 240)
+GAMEPLAY_SIZE = (200, 300)
+# Different scalers and rounding may shift edges by a pixel, whole panes in the wrong place can't pass
+MAX_MEAN_DIFF = 5
+
+CONFIGS = {
+    "horizontal": {"split_type": "horizontal", "video_position": "top", "edit_type": "crop", "original_video_percentage": 50},
+    "vertical-crop": {"split_type": "vertical", "video_position": "left", "edit_type": "crop", "original_video_percentage": 40},
+    "vertical-fit": {"split_type": "vertical", "video_position": "right", "edit_type": "fit", "original_video_percentage": 50}
+}
+
+def media(size, has_audio):
+    # What media_probe would store, so the test doesn't need ffprobe
+    return {
+        "width": size[0], "height": size[1], "fps": FPS, "codec": "h264", "rotation": 0,
+        "has_audio": has_audio, "audio_codec": "aac" if has_audio else None,
+        "duration": SECONDS, "keyframes": [0.0]
+    }
+
+def synthesize(path, source, size, audio):
+    subprocess.run([
+        FFMPEG_BINARY, "-y", "-loglevel", "error",
+        "-f", "lavfi", "-i", f"{source}=size={size[0]}x{size[1]}:rate={FPS}:duration={SECONDS}",
+        *(["-f", "lavfi", "-i", f"sine=frequency=440:duration={SECONDS}", "-c:a", "aac"] if audio else []),
+        "-c:v", "libx264", "-pix_fmt", "yuv420p", "-g", str(FPS),
+        str(path)
+    ], check=True)
+
+def decode(path):
+    # ffmpeg's input summary has the frame size, ffprobe isn't a test dependency
+    summary = subprocess.run([FFMPEG_BINARY, "-i", str(path)], capture_output=True, text=True).stderr
+    width, height = map(int, re.search(r"Video: .*?, (\d+)x(\d+)", summary).groups())
+    raw = subprocess.run([
+        FFMPEG_BINARY, "-loglevel", "error", "-i", str(path),
+        "-f", "rawvideo", "-pix_fmt", "rgb24", "-"
+    ], check=True, capture_output=True).stdout
+    return np.frombuffer(raw, dtype=np.uint8).reshape(-1, height, width, 3)
+
+@pytest.fixture(scope="module")
+def sources(tmp_path_factory):
+    directory = tmp_path_factory.mktemp("sources")
+    main, gameplay = directory / "main.mp4", directory / "gameplay.mp4"
+    synthesize(main, "testsrc", MAIN_SIZE, audio=True)
+    synthesize(gameplay, "testsrc2", GAMEPLAY_SIZE, audio=False)
+    return str(main), str(gameplay)
+
+def render(engine, sources, config):
+    main, gameplay = sources
+    editor = engine(main, gameplay, config, media=media(MAIN_SIZE, True), gameplay_media=media(GAMEPLAY_SIZE, False))
+    return decode(editor.start_editing(f"{engine.__name__}-{id(config)}"))
+
+@pytest.mark.parametrize("compositor", ["numpy", "clips_array"])
+@pytest.mark.parametrize("layout", CONFIGS)
+def test_moviepy_matches_ffmpeg(sources, layout, compositor, tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "outputDirectory", str(tmp_path))
+    monkeypatch.setattr(Config, "moviepyCompositor", compositor)
+    config = {**CONFIGS[layout], "encoding_profile": "draft", "max_resolution": "source"}
+
+    reference = render(FFmpegEditor, sources, config)
+    frames = render(Editor, sources, config)
+
+    assert frames.shape[1:] == reference.shape[1:]
+    count = min(len(frames), len(reference))
+    assert abs(len(frames) - len(reference)) <= 1
+    diff = np.abs(frames[:count].astype(np.int16) - reference[:count].astype(np.int16)).mean()
+    assert diff < MAX_MEAN_DIFF
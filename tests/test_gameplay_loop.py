@@ -0,0 +1,128 @@
+import subprocess
+import numpy as np
+import pytest
+from moviepy.config import FFMPEG_BINARY
+from config import Config
+from compositor import FrameReader
+from editor import Editor
+from ffmpeg_editor import FFmpegEditor
+from segmented_editor import SegmentedEditor
+
+FPS = 10
+GAMEPLAY_SECONDS = 7
+GAMEPLAY_FRAMES = GAMEPLAY_SECONDS * FPS
+MAIN_SIZE = (128, 128)
+GAMEPLAY_SIZE = (64, 64)
+# Main video on top, gameplay in the bottom half
+CONFIG = {
+    "split_type": "horizontal", "video_position": "top", "edit_type": "crop", "original_video_percentage": 50,
+    "encoding_profile": "draft", "max_resolution": "source"
+}
+
+def media(size, seconds, has_audio=False):
+    return {
+        "width": size[0], "height": size[1], "fps": FPS, "codec": "h264", "rotation": 0,
+        "has_audio": has_audio, "audio_codec": "aac" if has_audio else None,
+        "duration": seconds, "keyframes": [float(second) for second in range(seconds)]
+    }
+
+def decode_gray(path, size):
+    raw = subprocess.run([
+        FFMPEG_BINARY, "-loglevel", "error", "-i", str(path), "-f", "rawvideo", "-pix_fmt", "gray", "-"
+    ], check=True, capture_output=True).stdout
+    return np.frombuffer(raw, dtype=np.uint8).reshape(-1, size[1], size[0])
+
+@pytest.fixture(scope="module")
+def gameplay(tmp_path_factory):
+    """Frames showing their own number as 8 black or white bit columns, readable after scaling and encoding"""
+    path = tmp_path_factory.mktemp("gameplay") / "gameplay.mp4"
+    bit = f"mod(floor(N/pow(2,floor(X*8/{GAMEPLAY_SIZE[0]}))),2)"
+    subprocess.run([
+        FFMPEG_BINARY, "-y", "-loglevel", "error",
+        "-f", "lavfi", "-i", f"nullsrc=size={GAMEPLAY_SIZE[0]}x{GAMEPLAY_SIZE[1]}:rate={FPS}:duration={GAMEPLAY_SECONDS},geq=lum='16+219*{bit}':cb=128:cr=128",
+        "-c:v", "libx264", "-pix_fmt", "yuv420p", "-g", str(FPS),
+        str(path)
+    ], check=True)
+    return str(path)
+
+def frame_numbers(panes):
+    """Read the bit columns along the middle row of each gameplay pane"""
+    height, width = panes.shape[1:3]
+    column = width // 8
+    bits = panes[:, height // 2, column // 2::column][:, :8] > 128
+    return [int(sum(int(value) << index for index, value in enumerate(row))) for row in bits]
+
+def expected(start, count):
+    return [(int(start * FPS) + i) % GAMEPLAY_FRAMES for i in range(count)]
+
+def test_frame_reader_wraps_to_the_file_start(gameplay):
+    path = gameplay
+    reader = FrameReader(path, GAMEPLAY_SIZE, FPS, start=6.0, duration=GAMEPLAY_SECONDS, loop=True)
+    frames = np.empty((30, GAMEPLAY_SIZE[1], GAMEPLAY_SIZE[0], 3), dtype=np.uint8)
+    try:
+        buffer = np.empty_like(frames[0])
+        for index in range(len(frames)):
+            reader.read_to(index, buffer)
+            frames[index] = buffer
+    finally:
+        reader.close()
+
+    assert frame_numbers(frames[..., 0]) == expected(6.0, 30)
+
+@pytest.fixture(scope="module")
+def main_video(tmp_path_factory):
+    path = tmp_path_factory.mktemp("main") / "main.mp4"
+    subprocess.run([
+        FFMPEG_BINARY, "-y", "-loglevel", "error",
+        "-f", "lavfi", "-i", f"testsrc=size={MAIN_SIZE[0]}x{MAIN_SIZE[1]}:rate={FPS}:duration=20",
+        "-c:v", "libx264", "-pix_fmt", "yuv420p", "-g", str(FPS),
+        str(path)
+    ], check=True)
+    return str(path)
+
+def render(engine, main_video, gameplay_path, gameplay_start, video_id):
+    editor = engine(
+        main_video, gameplay_path, CONFIG, gameplay_start=gameplay_start,
+        media=media(MAIN_SIZE, 20), gameplay_media=media(GAMEPLAY_SIZE, GAMEPLAY_SECONDS)
+    )
+    frames = decode_gray(editor.start_editing(video_id), MAIN_SIZE)
+    return frames[:, MAIN_SIZE[1] // 2:]
+
+ENGINES = {
+    "ffmpeg": (FFmpegEditor, None),
+    "segmented": (SegmentedEditor, None),
+    "moviepy-numpy": (Editor, "numpy"),
+    "moviepy-clips-array": (Editor, "clips_array")
+}
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_gameplay_shorter_than_the_video_wraps_to_its_start(engine, main_video, gameplay, tmp_path, monkeypatch):
+    """20s of video over 7s of gameplay starting at 5s plays 5-7s, then 0-7s twice, then 0-6s"""
+    editor_class, compositor = ENGINES[engine]
+    monkeypatch.setattr(Config, "outputDirectory", str(tmp_path))
+    if compositor:
+        monkeypatch.setattr(Config, "moviepyCompositor", compositor)
+    # Seams at 5, 10 and 15s, each segment picks the gameplay up mid-file
+    monkeypatch.setattr(Config, "segmentMinSeconds", 0)
+    monkeypatch.setattr(Config, "segmentSeconds", 5)
+    path = gameplay
+
+    panes = render(editor_class, main_video, path, 5.0, engine)
+
+    assert frame_numbers(panes) == expected(5.0, 20 * FPS)
+
+def test_segments_match_a_single_pass_at_the_seams(main_video, gameplay, tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "outputDirectory", str(tmp_path))
+    monkeypatch.setattr(Config, "segmentMinSeconds", 0)
+    monkeypatch.setattr(Config, "segmentSeconds", 5)
+    path = gameplay
+
+    single = render(FFmpegEditor, main_video, path, 3.0, "single")
+    segmented = render(SegmentedEditor, main_video, path, 3.0, "segmented")
+
+    assert len(single) == len(segmented)
+    assert frame_numbers(segmented) == expected(3.0, 20 * FPS)
+    for seam in (5 * FPS, 10 * FPS, 15 * FPS):
+        window = slice(seam - 2, seam + 2)
+        assert frame_numbers(segmented[window]) == frame_numbers(single[window])
+        assert np.abs(segmented[window].astype(np.int16) - single[window].astype(np.int16)).mean() < 2
@@ -0,0 +1,38 @@
+import subprocess
+import pytest
+from moviepy.config import FFMPEG_BINARY
+from config import Config
+import media_probe
+
+@pytest.fixture
+def without_ffprobe(monkeypatch):
+    # What a worker with only the bundled ffmpeg sees
+    monkeypatch.setattr(Config, "ffprobeBinary", "ffprobe-not-installed")
+    media_probe.has_ffprobe.cache_clear()
+    yield
+    media_probe.has_ffprobe.cache_clear()
+
+def test_probe_falls_back_to_the_bundled_ffmpeg(tmp_path, without_ffprobe):
+    path = tmp_path / "source.mp4"
+    subprocess.run([
+        FFMPEG_BINARY, "-y", "-loglevel", "error",
+        "-f", "lavfi", "-i", "testsrc=size=320x240:rate=25:duration=3",
+        "-f", "lavfi", "-i", "sine=frequency=440:duration=3",
+        "-c:v", "libx264", "-g", "25", "-c:a", "aac", "-shortest",
+        str(path)
+    ], check=True)
+
+    media = media_probe.probe(str(path))
+
+    assert (media["width"], media["height"], media["fps"]) == (320, 240, 25)
+    assert media["codec"] == "h264"
+    assert media["has_audio"]
+    assert media["duration"] == pytest.approx(3, abs=0.1)
+    assert media["keyframes"] == pytest.approx([0, 1, 2], abs=0.05)
+
+def test_unreadable_file_is_a_media_error(tmp_path, without_ffprobe):
+    path = tmp_path / "source.mp4"
+    path.write_bytes(b"not a video")
+
+    with pytest.raises(media_probe.MediaError):
+        media_probe.probe(str(path))
@@ -0,0 +1,34 @@
+import base64
+import json
+import pytest
+import app as app_module
+from helpers import encode_cursor, decode_cursor
+
+@pytest.fixture
+def client():
+    app_module.app.config["TESTING"] = True
+    client = app_module.app.test_client()
+    with client.session_transaction() as session:
+        session["user_id"] = "user"
+    return client
+
+def tampered(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+def test_cursor_round_trip():
+    cursor = encode_cursor("2026-10-18 12:00:00.123456", "job")
+    assert decode_cursor(cursor, ("infinity", "")) == ("2026-10-18 12:00:00.123456", "job")
+    assert decode_cursor(None, ("infinity", "")) == ("infinity", "")
+
+@pytest.mark.parametrize("cursor", ["not base64!", tampered({"a": 1}), tampered(["only one"]), tampered([1, "job"])])
+def test_malformed_cursor_is_rejected(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor, ("infinity", ""))
+
+@pytest.mark.parametrize("cursor", ["garbage", tampered(["yesterday", "job"])])
+def test_tampered_cursor_is_a_bad_request(client, cursor):
+    assert client.post("/progress", data={"cursor": cursor}).status_code == 400
+    assert client.post("/output", data={"cursor": cursor}).status_code == 400
+
+def test_tampered_gameplay_cursor_is_a_bad_request(client):
+    assert client.get("/explore", query_string={"cursor": tampered([1])}).status_code == 400
@@ -0,0 +1,109 @@
+import json
+import time
+import logging
+import threading
+from collections import OrderedDict
+from config import Config
+from redis_pool import redis_client
+
+# Setup logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Process local tier in front of redis, kept short lived since other processes can't invalidate it
+_local = OrderedDict()
+_local_lock = threading.Lock()
+
+def _local_get(key):
+    with _local_lock:
+        item = _local.get(key)
+        if item is None:
+            return None
+        expires, value = item
+        if expires < time.monotonic():
+            del _local[key]
+            return None
+        _local.move_to_end(key)
+        return value
+
+def _local_set(key, value):
+    with _local_lock:
+        _local[key] = (time.monotonic() + Config.localCacheTtl, value)
+        _local.move_to_end(key)
+        while len(_local) > Config.localCacheSize:
+            _local.popitem(last=False)
+
+def _read_through(key, load):
+    """Look the key up locally, then in redis, then load it from the database"""
+    value = _local_get(key)
+    if value is not None:
+        return value
+
+    try:
+        cached = redis_client.get(key)
+        if cached:
+            value = json.loads(cached)
+            _local_set(key, value)
+            return value
+    except Exception as e:
+        logging.warning(f"User cache read failed: {e}")
+
+    value = load()
+    # Misses aren't cached, a sender may sign up any moment
+    if value:
+        _local_set(key, value)
+        try:
+            redis_client.set(key, json.dumps(value, default=str), ex=Config.userCacheTtl)
+        except Exception as e:
+            logging.warning(f"User cache write failed: {e}")
+    return value
+
+def get_user(db, user_id):
+    """Return a users row by id, db is db_app or a bg_db.db instance"""
+    return _read_through(
+        f"user_cache:user:{user_id}",
+        lambda: db.fetch_named("user_by_id", args=(user_id,), one=True) or None
+    )
+
+def get_user_by_ig_id(db, ig_id):
+    """Return a users row by Instagram id"""
+    user_id = _read_through(
+        f"user_cache:ig:{ig_id}",
+        lambda: (db.fetch_named("user_id_by_ig_id", args=(ig_id,), one=True) or {}).get("id")
+    )
+    if not user_id:
+        return None
+
+    user = get_user(db, user_id)
+    # The pointer outlives an ig_id change, the user row is the authority
+    if not user or str(user.get("ig_id")) != str(ig_id):
+        invalidate_user(user_id)
+        _forget(f"user_cache:ig:{ig_id}")
+        user = db.fetch_named("user_by_ig_id", args=(ig_id,), one=True) or None
+    return user
+
+def get_configs(db, user_id):
+    """Return all video configurations of a user"""
+    return _read_through(
+        f"user_cache:configs:{user_id}",
+        lambda: db.fetch_named("configs_by_user", args=(user_id,))
+    ) or []
+
+def get_config(db, user_id, config_id):
+    for config in get_configs(db, user_id):
+        if config.get("id") == config_id:
+            return config
+    return None
+
+def invalidate_user(user_id):
+    _forget(f"user_cache:user:{user_id}")
+
+def invalidate_configs(user_id):
+    _forget(f"user_cache:configs:{user_id}")
+
+def _forget(key):
+    with _local_lock:
+        _local.pop(key, None)
+    try:
+        redis_client.delete(key)
+    except Exception as e:
+        logging.warning(f"User cache invalidation failed: {e}")
@@ -1,95 +1,235 @@
 from config import Config
 import re
-import requests
 from uuid import uuid4
 import os
+import subprocess
 import datetime
 import time
 from random import randint
 from editor import Editor
+from ffmpeg_editor import FFmpegEditor
+from segmented_editor import SegmentedEditor
+from rendition_cache import RenditionCache
+import gameplay_source
+import media_probe
 from graph_api import GraphApi
+from receive import Receive
+from downloader import Downloader, get_session
+from download_cache import DownloadCache
+from render_index import RenderIndex
 import yt_dlp
 import logging
 from bg_db import db
+import user_cache
+import job_events
+import metrics
+import rusage
+import posters
+from contextlib import contextmanager
+import prepared
+from celery import chain, shared_task
 
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# Selectable rendering engines
+RENDER_ENGINES = {
+    "moviepy": Editor,
+    "ffmpeg": FFmpegEditor,
+    "ffmpeg-segmented": SegmentedEditor
+}
+
 class VideoProcessor:
-    def __init__(self, user, payload, config) -> None:
+    # Attributes carried between the pipeline tasks
+    _state_fields = ("video_path", "source_hash", "gameplay_id", "gameplay_path", "gameplay_start", "render_key", "output_path", "reused")
+
+    def __init__(self, user, payload, config, job_id=None) -> None:
         self.user = user
         self.config = config
         self.payload = payload
-        self.job_id = str(uuid4())
+        self.job_id = job_id or str(uuid4())
         self.db = db()
+        self.download_cache = DownloadCache()
+        self.video_path = None
+        # Content hash of the source video
+        self.source_hash = None
+        self.gameplay_id = None
+        self.gameplay_path = None
+        # Probed metadata of the source and of the gameplay file rendered with, reloaded by each task
+        self.media = None
+        self.gameplay_media = None
+        # Keyframe the gameplay starts playing from
+        self.gameplay_start = 0.0
+        self.render_key = None
+        self.output_path = None
+        # Output shared with an earlier identical render
+        self.reused = False
+        # video_jobs columns written together with the next status change
+        self._job_updates = {}
+        # job_metrics columns measured by the current stage
+        self._metrics = {}
+
+    def to_state(self):
+        # Rows stay out of the broker, each task reads them through the cache
+        state = {"user_id": self.user["id"], "config_id": self.config["id"], "payload": self.payload, "job_id": self.job_id}
+        for field in VideoProcessor._state_fields:
+            state[field] = getattr(self, field)
+        return state
+
+    @staticmethod
+    def from_state(state):
+        processor = VideoProcessor(None, state["payload"], None, job_id=state["job_id"])
+        processor.user = user_cache.get_user(processor.db, state["user_id"])
+        processor.config = user_cache.get_config(processor.db, state["user_id"], state["config_id"])
+        for field in VideoProcessor._state_fields:
+            setattr(processor, field, state.get(field))
+        return processor
 
     def start_process(self):
+        """Queue the job as download -> prepare -> render -> finalize, each on its own queue"""
+        return chain(
+            download_stage.s(self.to_state()),
+            prepare_stage.s(),
+            render_stage.s(),
+            finalize_stage.s()
+        ).apply_async()
+
+    def download(self):
+        """Create the job row and fetch the source video"""
         video_url = self.payload.get("url")
         title = self.payload.get('title', "")
         is_attachment = self.payload.get("type") == "attachment"
 
+        created_at = datetime.datetime.now()
         # Insert job
         try:
             if is_attachment:
-                self.db.update("INSERT INTO video_jobs (id, user_id, caption, video_url, video_type, config_id, created_at) VALUES (%s, %s, %s, %s, %s, %s, %s);", args=(self.job_id, self.user["id"], title, video_url, "instagram", self.config['id'], datetime.datetime.now()))
-                video_path = self.download_attachment_video(video_url)
+                self.db.update("INSERT INTO video_jobs (id, user_id, caption, video_url, video_type, config_id, created_at) VALUES (%s, %s, %s, %s, %s, %s, %s);", args=(self.job_id, self.user["id"], title, video_url, "instagram", self.config['id'], created_at))
+                self._announce(created_at, caption=title)
+                self.video_path = self.download_attachment_video(video_url)
             else:
-                self.db.update("INSERT INTO video_jobs (id, user_id, video_url, config_id, created_at) VALUES (%s, %s, %s, %s, %s);", args=(self.job_id, self.user["id"], video_url, self.config['id'], datetime.datetime.now()))
-                video_path = self.download_link_video(video_url)
+                self.db.update("INSERT INTO video_jobs (id, user_id, video_url, config_id, created_at) VALUES (%s, %s, %s, %s, %s);", args=(self.job_id, self.user["id"], video_url, self.config['id'], created_at))
+                self._announce(created_at)
+                self.video_path = self.download_link_video(video_url)
         except Exception as e:
-            self.db.put_connection()
             logging.error("job creation error")
-            return
+            return False
 
-        if not video_path:
+        if not self.video_path:
             self._update_status("Failed to download video", "failed")
-            self.db.put_connection()
-            return
+            return False
         
-        self._update_status(None, "downloaded")
+        # Reject unusable sources before any render work is queued
+        try:
+            self.media = self.probe_source(self.video_path)
+        except (media_probe.MediaError, subprocess.CalledProcessError) as e:
+            reason = e if isinstance(e, media_probe.MediaError) else "unreadable file"
+            self._update_status(f"Video rejected: {reason}", "failed")
+            return False
+        except Exception as e:
+            logging.warning(f"Couldn't probe video, the renderer will: {e}")
         
+        self._update_status(None, "downloaded")
+        return True
+
+    def prepare(self):
+        """Publish no-split videos directly, otherwise pick the gameplay to render with"""
         if not self.config.get("split_type"):
-            copy_path = Editor.copycat(video_path)
-            if copy_path:
-                self._update_status(None, "completed")
-            else:   
-                self._update_status("Couldn't copy video", "failed")
-        else:  
-            gameplay_path = self.get_gameplay()
-            if not gameplay_path:
-                self._update_status("Couldn't get gameplay video", "failed")
-                self.db.put_connection()
-                return 
-            
-            self._update_status(None, "processing")
             try:
-                edit_obj = Editor(video_path, gameplay_path, self.config)
-                video_url = edit_obj.start_editing(self.job_id)
-            except Exception as es:
-                logging.error("Error during video editing")
-                self._update_status("Error during video editing", "failed")
-                self.db.put_connection()
-                return 
-            
-            if video_url:
-                self._update_status(None, "completed")
-            else:
-                self._update_status(None, "failed")
+                self.output_path = Editor.copycat(self.video_path, self.job_id)
+            except Exception as e:
+                self.output_path = None
+            if not self.output_path:
+                self._update_status("Couldn't copy video", "failed")
+                return False
+            return True
+        
+        self._load_media()
+        with self._timed("gameplay"):
+            self.gameplay_path = self.get_gameplay()
+        if not self.gameplay_path:
+            self._update_status("Couldn't get gameplay video", "failed")
+            return False
+        
+        # Identical source, gameplay and parameters were already rendered, render then has nothing to do
+        self.render_key = self._render_key(self.video_path)
+        if self.render_key:
+            self._reuse_render(self.render_key)
+        return True
 
-        # Put connection back
-        self.db.put_connection()
+    def render(self):
+        """Composite and encode the split screen"""
+        if self.output_path:
+            # Published or reused during prepare
+            return True
+        
+        self._update_status(None, "processing")
+        self._load_media()
+        # A rendition miss is a full transcode, so it's built here on the render queue
+        with self._timed("gameplay"):
+            gameplay_path = self.get_rendition(self.video_path, self.gameplay_path)
+        try:
+            with self._timed("load"):
+                edit_obj = RENDER_ENGINES[Config.renderEngine](
+                    self.video_path, gameplay_path, self.config,
+                    gameplay_start=self.gameplay_start or 0.0, media=self.media, gameplay_media=self.gameplay_media
+                )
+            edit_obj.on_progress = job_events.ProgressReporter(self.user["id"], self.job_id)
+            self.output_path = edit_obj.start_editing(self.job_id)
+            self._record_encoding(edit_obj.profile_name, edit_obj.encode_seconds)
+            self._record_render_metrics(edit_obj)
+        except Exception as es:
+            logging.error("Error during video editing")
+            self._update_status("Error during video editing", "failed")
+            return False
+        
+        if not self.output_path:
+            self._update_status(None, "failed")
+            return False
+        return True
+
+    def finalize(self):
+        """Complete the job and tell the user their video is ready"""
+        register = self.render_key and not self.reused
+        try:
+            # Ready before the job shows as completed, the gallery links them straight away
+            posters.generate(self.output_path)
+        except Exception as e:
+            logging.warning(f"Failed to create poster: {e}")
+        try:
+            # Reference and index entry share one commit, so cleanup never sees the output unreferenced
+            with self.db.transaction() as cur:
+                if register:
+                    self._set_job(render_key=self.render_key, output_file=f"{self.job_id}.mp4")
+                self._flush_job(cur, status="completed")
+                if register:
+                    RenderIndex(self.db).register(self.render_key, f"{self.job_id}.mp4", cur=cur)
+            logging.info(f"Job {self.job_id} updated to status 'completed'")
+        except Exception as e:
+            logging.error("Failed to complete job")
+            return False
+        job_events.publish(self.user["id"], self.job_id, status="completed", progress=100)
+        metrics.count("jobs", label="completed")
+
+        if self.user.get("ig_id"):
+            try:
+                Receive(str(self.user["ig_id"])).handleMessage("Your video is ready!")
+            except Exception as e:
+                logging.error("Failed to notify user")
+        return True
         
     def download_attachment_video(self, url):
         logging.info(f"Downloading video from attachment URL: {url}")
         try:            
-            res = requests.get(url)
-            res.raise_for_status()
+            source_key = f"ig:{self.payload['reel_video_id']}"
+            cached_path = self._from_cache(source_key)
+            if cached_path:
+                return cached_path
             
             file_path = os.path.join(Config.reelsDirectory, self.job_id + ".mp4")
-            with open(file_path, "wb") as file:
-                for chunk in res.iter_content(100000):
-                    file.write(chunk)
-            
+            stats = Downloader().download(url, file_path)
+            self._record_download(stats)
+            self._to_cache(source_key, file_path)
             return file_path        
         except Exception as e:
             logging.error("Failed to download attachment video")
@@ -97,13 +237,20 @@ class VideoProcessor:
     
     def _tiktok_download(self, url):
         try:           
-            res = requests.post("https://tikwm.com/api/", data={
+            # Full links carry the video id, short vm.tiktok links need the API to resolve it
+            match = re.search(r"/video/(\d+)", url)
+            if match:
+                cached_path = self._from_cache(f"tt:{match.group(1)}")
+                if cached_path:
+                    return cached_path
+            
+            res = get_session().post("https://tikwm.com/api/", data={
                 "url": url,
                 "count": 12,
                 "cursor": 0,
                 "web": 1,
                 "hd": 1
-            })
+            }, timeout=Config.downloadTimeout)
             res.raise_for_status()
 
             data = res.json()
@@ -113,17 +260,19 @@ class VideoProcessor:
                 logging.error(f"Couldn't extract TikTok video: {url}")
                 return None
             
+            source_key = f"tt:{video.get('id') or url}"
+            cached_path = self._from_cache(source_key)
+            if cached_path:
+                return cached_path
+            
             v_url = "https://tikwm.com" + video["play"]
 
-            res = requests.get(v_url)
-            res.raise_for_status()
-            
             file_path = os.path.join(Config.reelsDirectory, f"{self.job_id}.{v_url.rsplit('.')[-1]}")
-            with open(file_path, "wb") as file:
-                for chunk in res.iter_content(102400):
-                    file.write(chunk)
+            stats = Downloader().download(v_url, file_path)
+            self._record_download(stats)
             
-            self.db.update("UPDATE video_jobs SET caption = %s, video_type = %s WHERE id = %s;", args=(video.get("title"), 'youtube', self.job_id))
+            self._set_job(caption=video.get("title"), video_type='youtube')
+            self._to_cache(source_key, file_path, {"caption": video.get("title"), "video_type": 'youtube'})
             return file_path   
         except Exception as e:
             logging.error("TikTok download failed")
@@ -139,6 +288,11 @@ class VideoProcessor:
     def _yt_download(self, url):
         file_path = os.path.join(Config.reelsDirectory, self.job_id)
         try:
+            source_key = f"yt:{url}"
+            cached_path = self._from_cache(source_key)
+            if cached_path:
+                return cached_path
+            
             ydl_opts = {
                 'outtmpl': f'{file_path}.%(ext)s',
                 'format': 'best[ext=mp4]',
@@ -146,11 +300,20 @@ class VideoProcessor:
             }
 
             with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=True)
+                # Resolve the media URL only, the shared downloader fetches it
+                info = ydl.extract_info(url, download=False)
                 if info.get("description"):
-                    self.db.update("UPDATE video_jobs SET caption = %s, video_type = %s WHERE id = %s;", args=(info["description"], 'youtube', self.job_id))
+                    self._set_job(caption=info["description"], video_type='youtube')
                 
                 ext = info.get("ext", "mp4")
+                if info.get("url") and info.get("protocol") in ("http", "https"):
+                    stats = Downloader().download(info["url"], f"{file_path}.{ext}", headers=info.get("http_headers"))
+                    self._record_download(stats)
+                else:
+                    # Segmented formats (HLS/DASH) need yt-dlp itself
+                    ydl.process_info(info)
+                
+                self._to_cache(source_key, f"{file_path}.{ext}", {"caption": info.get("description"), "video_type": 'youtube'})
                 return f"{file_path}.{ext}"
 
         except Exception as e:
@@ -171,6 +334,29 @@ class VideoProcessor:
             logging.error("Link download failed")
             return None
             
+    def probe_source(self, video_path):
+        """Probe the source once and check it against the config without decoding it"""
+        if not self.source_hash:
+            self.source_hash = DownloadCache.file_hash(video_path)
+        media = media_probe.source_metadata(self.db, self.source_hash, video_path)
+        media_probe.validate(media)
+        if self.config.get("split_type"):
+            layout = Editor.layout(self.config, *Editor.source_size(self.config, media["width"], media["height"]))
+            x1, y1, x2, y2 = layout["main_box"]
+            if min(x2 - x1, y2 - y1, *layout["gameplay_size"]) <= 0:
+                raise media_probe.MediaError("the configured split leaves no room for one of the videos")
+        return media
+    
+    def _load_media(self):
+        """Read the metadata stored for the source and gameplay, the broker only carries their keys"""
+        try:
+            if self.media is None and self.source_hash:
+                self.media = media_probe.source_metadata(self.db, self.source_hash, self.video_path)
+            if self.gameplay_media is None and self.gameplay_id:
+                self.gameplay_media = media_probe.gameplay_metadata(self.db, self.gameplay_id, self.gameplay_path)
+        except Exception as e:
+            logging.warning(f"Couldn't load media metadata, the renderer will probe: {e}")
+    
     def get_gameplay(self):
         try:        
             config_videos = self.db.fetch("SELECT gameplay_id FROM config_gameplays WHERE config_id = %s;", args=(self.config["id"],))
@@ -179,18 +365,206 @@ class VideoProcessor:
                 return None
             
             gameplay_id = config_videos[randint(0, len(config_videos) - 1)]["gameplay_id"]
-            self.db.update("UPDATE video_jobs SET gameplay_id = %s WHERE id = %s;", args=(gameplay_id, self.job_id))
-            return os.path.join(Config.gameplayDirectory, f"{gameplay_id}.mp4")
+            self._set_job(gameplay_id=gameplay_id)
+            self.gameplay_id = gameplay_id
+            gameplay_path = os.path.join(Config.gameplayDirectory, f"{gameplay_id}.mp4")
+            self.gameplay_start = self._gameplay_start(gameplay_id, gameplay_path)
+            return gameplay_path
         except Exception as e:
             logging.error("Failed to fetch gameplay video")
             return None
     
+    def _gameplay_start(self, gameplay_id, gameplay_path):
+        """Random keyframe of the gameplay, so jobs don't all open on the same footage"""
+        try:
+            self.gameplay_media = media_probe.gameplay_metadata(self.db, gameplay_id, gameplay_path)
+            needed = self.media["duration"] if self.media else None
+            return gameplay_source.pick_start(self.gameplay_media["keyframes"], self.gameplay_media["duration"], needed)
+        except Exception as e:
+            logging.warning(f"Couldn't pick a gameplay start, using the beginning: {e}")
+            return 0.0
+    
+    def get_rendition(self, video_path, gameplay_path):
+        """Swap the gameplay for a cached rendition already sized for this video"""
+        try:
+            media = self.media or media_probe.probe(video_path, keyframes=False)
+            width, height = Editor.source_size(self.config, media["width"], media["height"])
+            target_width, target_height = Editor.layout(self.config, width, height)["gameplay_size"]
+            gameplay_id = os.path.splitext(os.path.basename(gameplay_path))[0]
+            rendition_path = RenditionCache().get(gameplay_id, target_width, target_height)
+            if self.gameplay_media:
+                # Same timeline and keyframes, already at the target size and upright
+                self.gameplay_media = {**self.gameplay_media, "width": target_width, "height": target_height, "rotation": 0}
+            return rendition_path
+        except Exception as e:
+            logging.warning(f"Gameplay rendition unavailable, using original: {e}")
+            return gameplay_path
+    
+    def _render_key(self, video_path):
+        try:
+            if not self.source_hash:
+                self.source_hash = DownloadCache.file_hash(video_path)
+            return RenderIndex.render_key(self.source_hash, self.gameplay_id, self.config)
+        except Exception as e:
+            logging.error("Failed to compute render key")
+            return None
+    
+    def _reuse_render(self, render_key):
+        """Point the job at an existing output instead of rendering it again"""
+        try:
+            file_name = RenderIndex(self.db).lookup(render_key)
+            if not file_name:
+                return False
+            
+            self._set_job(render_key=render_key, output_file=file_name)
+            logging.info(f"Job {self.job_id} reuses rendered output {file_name}")
+            self.output_path = os.path.join(Config.outputDirectory, file_name)
+            self.reused = True
+            return True
+        except Exception as e:
+            logging.error("Failed to reuse rendered output")
+            return False
+    
+    def _from_cache(self, source_key):
+        """Link a cached source into the reels directory, skipping the network"""
+        entry = self.download_cache.lookup(source_key, os.path.join(Config.reelsDirectory, self.job_id))
+        if not entry:
+            return None
+        
+        self.source_hash = entry["hash"]
+        meta = entry["meta"]
+        if meta.get("caption"):
+            self._set_job(caption=meta["caption"], video_type=meta.get("video_type"))
+        return entry["path"]
+    
+    def _to_cache(self, source_key, file_path, meta=None):
+        self.source_hash = self.download_cache.store(source_key, file_path, meta)
+    
+    def _record_download(self, stats):
+        self._set_job(download_bytes=stats["bytes"], download_bytes_per_sec=stats["bytes_per_sec"])
+    
+    def _set_job(self, **columns):
+        """Buffer video_jobs columns until the next status change"""
+        self._job_updates.update(columns)
+    
+    def _flush_job(self, cur=None, **columns):
+        """Write buffered columns plus these in a single UPDATE"""
+        columns = {**self._job_updates, **columns}
+        if not columns:
+            return
+        name = prepared.job_update(list(columns))
+        args = (*columns.values(), self.job_id)
+        if cur:
+            prepared.execute(cur, name, args)
+        else:
+            self.db.update_named(name, args=args)
+        self._job_updates = {}
+    
     def _update_status(self, message, status):
         try:    
             if message:
-                self.db.update("UPDATE video_jobs SET processing_errors = %s, status = %s WHERE id = %s;", args=(message, status, self.job_id))
+                self._flush_job(processing_errors=message, status=status)
             else:
-                self.db.update("UPDATE video_jobs SET status = %s WHERE id = %s;", args=(status, self.job_id))
+                self._flush_job(status=status)
             logging.info(f"Job {self.job_id} updated to status '{status}'")
         except Exception as e:
             logging.error("Failed to update job status")
+            return
+        if status == "failed":
+            metrics.count("jobs", label="failed")
+        if self.user:
+            job_events.publish(self.user["id"], self.job_id, status=status, message=message)
+    
+    def _announce(self, created_at, caption=None):
+        """Publish a freshly inserted job so open progress pages can list it"""
+        job_events.publish(
+            self.user["id"], self.job_id,
+            status="pending", caption=caption, config_name=self.config.get("config_name"),
+            created_at=created_at
+        )
+    
+    def _record_encoding(self, profile_name, encode_seconds):
+        self._set_job(encoding_profile=profile_name, encode_seconds=encode_seconds)
+        logging.info(f"Job {self.job_id} encoded with '{profile_name}' in {encode_seconds:.1f}s")
+    
+    @contextmanager
+    def _timed(self, stage):
+        """Add the wall clock time of the block to the stage's job_metrics column and histogram"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            column = f"{stage}_seconds"
+            self._metrics[column] = self._metrics.get(column, 0.0) + seconds
+            metrics.observe_stage(stage, seconds)
+    
+    def _record_render_metrics(self, edit_obj):
+        if edit_obj.composite_seconds is not None:
+            self._metrics["composite_seconds"] = edit_obj.composite_seconds
+            metrics.observe_stage("composite", edit_obj.composite_seconds)
+        self._metrics["encode_seconds"] = edit_obj.encode_seconds
+        metrics.observe_stage("encode", edit_obj.encode_seconds)
+        if edit_obj.frames:
+            self._metrics["frames"] = edit_obj.frames
+            self._metrics["encode_fps"] = edit_obj.frames / edit_obj.encode_seconds if edit_obj.encode_seconds else None
+            metrics.count("frames_encoded", edit_obj.frames)
+    
+    def _flush_metrics(self):
+        """Upsert the stage's measurements, a job's peaks are the highest any of its stages saw"""
+        if not self._metrics:
+            return
+        self._metrics["peak_rss_kb"], self._metrics["children_peak_rss_kb"] = rusage.peak_kb()
+        columns = list(self._metrics)
+        assignments = ", ".join(
+            f"{column} = GREATEST(job_metrics.{column}, EXCLUDED.{column})" if column.endswith("peak_rss_kb") else f"{column} = EXCLUDED.{column}"
+            for column in columns
+        )
+        query = f"""
+            INSERT INTO job_metrics (job_id, {", ".join(columns)}) VALUES (%s{", %s" * len(columns)})
+            ON CONFLICT (job_id) DO UPDATE SET {assignments};"""
+        self.db.update(query, args=(self.job_id, *self._metrics.values()))
+        self._metrics = {}
+
+def _run_stage(state, stage):
+    """Run one pipeline stage, a None state means an earlier stage ended the job"""
+    if state is None:
+        return None
+    # Peaks are measured per stage, the worker's own lifetime peaks include earlier jobs
+    rusage.reset()
+    processor = VideoProcessor.from_state(state)
+    try:
+        if not (processor.user and processor.config):
+            processor._update_status("Configuration was deleted", "failed")
+            return None
+        with processor._timed(stage):
+            result = getattr(processor, stage)()
+        return processor.to_state() if result else None
+    finally:
+        try:
+            # Columns set by a stage that ends without a status change
+            processor._flush_job()
+        except Exception as e:
+            logging.error("Failed to update job")
+        try:
+            processor._flush_metrics()
+        except Exception as e:
+            logging.warning("Failed to record job metrics")
+        processor.db.put_connection()
+        metrics.report_process("worker")
+
+@shared_task(name="video_processor.download_stage")
+def download_stage(state):
+    return _run_stage(state, "download")
+
+@shared_task(name="video_processor.prepare_stage")
+def prepare_stage(state):
+    return _run_stage(state, "prepare")
+
+@shared_task(name="video_processor.render_stage", acks_late=True)
+def render_stage(state):
+    return _run_stage(state, "render")
+
+@shared_task(name="video_processor.finalize_stage")
+def finalize_stage(state):
+    return _run_stage(state, "finalize")
@@ -0,0 +1,59 @@
+import os
+import json
+import socket
+import logging
+from redis.exceptions import ResponseError
+from config import Config
+from redis_pool import redis_client
+from app import app, process_ig_webhook
+import db_app
+
+# Setup logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+def ensure_group():
+    """Create the consumer group, reading the stream from the start"""
+    try:
+        redis_client.xgroup_create(Config.webhookStream, Config.webhookGroup, id="0", mkstream=True)
+    except ResponseError as e:
+        if "BUSYGROUP" not in str(e):
+            raise
+
+def handle(fields):
+    body = json.loads(fields[b"body"])
+    if body.get("object") != "instagram":
+        logging.warning("Dropping unrecognized webhook event")
+        return
+
+    # Route helpers keep their connection on flask.g
+    with db_app.app_context(app):
+        process_ig_webhook(body)
+
+def run(consumer):
+    """Process webhook entries with at-least-once delivery"""
+    ensure_group()
+    logging.info(f"Webhook consumer {consumer} started")
+    while True:
+        # Take over entries a crashed consumer left unacknowledged
+        entries = redis_client.xautoclaim(
+            Config.webhookStream, Config.webhookGroup, consumer,
+            min_idle_time=Config.webhookClaimIdleMs, start_id="0-0", count=10
+        )[1]
+        if not entries:
+            response = redis_client.xreadgroup(Config.webhookGroup, consumer, {Config.webhookStream: ">"}, count=10, block=5000)
+            entries = response[0][1] if response else []
+
+        for entry_id, fields in entries:
+            # Trimmed from the stream while pending
+            if fields is None:
+                redis_client.xack(Config.webhookStream, Config.webhookGroup, entry_id)
+                continue
+            try:
+                handle(fields)
+                redis_client.xack(Config.webhookStream, Config.webhookGroup, entry_id)
+            except Exception as e:
+                # Left pending, it will be claimed again
+                logging.exception(f"Failed to process webhook entry {entry_id}: {e}")
+
+if __name__ == "__main__":
+    run(f"{socket.gethostname()}-{os.getpid()}")